@@ -4,6 +4,7 @@
 import os
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import documentai_v1 as documentai
 from google.api_core.client_options import ClientOptions
 from google.auth.exceptions import DefaultCredentialsError
@@ -12,6 +13,7 @@ import google.auth
 PROJECT_ID = "realeagent-vertex-ai"
 PROJECT_NUMBER = "209579160014"
 LOCATION = "us"  # Document AI only supports 'us' for custom processors
+OPERATION_TIMEOUT = 300
 
 class ProcessorManager:
     def __init__(self):
@@ -35,56 +37,78 @@ class ProcessorManager:
         self.parent = f"projects/{PROJECT_ID}/locations/{LOCATION}"
         
     def list_existing_processors(self):
-        """List all existing processors"""
+        """List all existing processors, keyed by display name"""
         try:
             processors = self.client.list_processors(parent=self.parent)
             existing = {}
             for processor in processors:
-                existing[processor.display_name] = processor.name
+                existing[processor.display_name] = processor
             return existing
         except Exception as e:
             print(f"Error listing processors: {e}")
             return {}
-        
-    def create_processor(self, display_name: str, processor_type: str) -> str:
-        """Create a Document AI processor - fixed version"""
-        
-        # First check if it already exists
-        existing = self.list_existing_processors()
-        if display_name in existing:
-            print(f"✓ Processor '{display_name}' already exists")
-            return existing[display_name]
-        
-        # Create new processor
+    
+    def start_create(self, display_name: str, processor_type: str):
+        """Start creating a processor and return its long-running operation"""
         processor = documentai.Processor(
             display_name=display_name,
             type_=processor_type
         )
+        print(f"Creating processor: {display_name}")
+        return self.client.create_processor(
+            parent=self.parent,
+            processor=processor
+        )
+    
+    def ensure_processors(self, processors: list, existing: dict) -> dict:
+        """Create every processor missing from `existing` concurrently
         
-        try:
-            print(f"Creating processor: {display_name}")
-            # Create the processor
-            operation = self.client.create_processor(
-                parent=self.parent,
-                processor=processor
-            )
-            
-            print(f"Waiting for operation to complete...")
-            # Wait for the operation to complete
-            result = operation.result(timeout=300)
-            
-            print(f"✓ Created processor: {result.name}")
-            return result.name
-            
-        except Exception as e:
-            print(f"✗ Error creating {display_name}: {e}")
-            # If it's an "already exists" error, try to find it
-            if "already exists" in str(e).lower():
-                existing = self.list_existing_processors()
-                if display_name in existing:
-                    print(f"✓ Found existing processor: {existing[display_name]}")
-                    return existing[display_name]
-            return None
+        All create requests are sent first, then the long-running
+        operations are awaited together, so total time is roughly that of
+        the slowest create rather than the sum of all of them.
+        """
+        results = {
+            proc["name"]: existing[proc["name"]]
+            for proc in processors if proc["name"] in existing
+        }
+        for name in results:
+            print(f"✓ Processor '{name}' already exists")
+        
+        operations = {}
+        for proc in processors:
+            if proc["name"] in results:
+                continue
+            try:
+                operations[proc["name"]] = self.start_create(proc["name"], proc["type"])
+            except Exception as e:
+                print(f"✗ Error creating {proc['name']}: {e}")
+        
+        if not operations:
+            return results
+        
+        print(f"Waiting for {len(operations)} operation(s) to complete...")
+        with ThreadPoolExecutor(max_workers=len(operations)) as pool:
+            futures = {
+                name: pool.submit(operation.result, timeout=OPERATION_TIMEOUT)
+                for name, operation in operations.items()
+            }
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                    print(f"✓ Created processor: {results[name].name}")
+                except Exception as e:
+                    print(f"✗ Error creating {name}: {e}")
+        
+        # Anything that failed with "already exists" raced another creator; one
+        # more list picks those up instead of a list per processor
+        missing = [proc["name"] for proc in processors if proc["name"] not in results]
+        if missing:
+            existing = self.list_existing_processors()
+            for name in missing:
+                if name in existing:
+                    print(f"✓ Found existing processor: {existing[name].name}")
+                    results[name] = existing[name]
+        return results
 
 def main():
     """Create all required processors"""
@@ -106,38 +130,45 @@ def main():
     processors = [
         {
             "name": "RealeAgent Lead Paint Disclosure",
+            "key": "lead_paint",
             "type": "CUSTOM_EXTRACTION_PROCESSOR",
             "description": "Extract fields from Lead-Based Paint Disclosure forms"
         },
         {
             "name": "RealeAgent CA RPA",
+            "key": "ca_rpa",
             "type": "CUSTOM_EXTRACTION_PROCESSOR", 
             "description": "Extract fields from California Residential Purchase Agreement"
         },
         {
             "name": "RealeAgent BIA",
+            "key": "bia",
             "type": "CUSTOM_EXTRACTION_PROCESSOR",
             "description": "Extract fields from Buyer's Inspection Advisory"
         },
         {
             "name": "RealeAgent Form Parser",
+            "key": "form_parser",
             "type": "FORM_PARSER_PROCESSOR",
             "description": "General form parsing for other CAR forms"
         }
     ]
     
-    # Create processors and save IDs
-    processor_ids = {}
+    # Create missing processors (one list call, creates run concurrently)
+    created = manager.ensure_processors(processors, existing)
     
+    # Save processor IDs
+    processor_ids = {}
     for proc in processors:
-        processor_id = manager.create_processor(proc["name"], proc["type"])
-        if processor_id:
+        processor = created.get(proc["name"])
+        if processor:
             # Extract just the processor ID from the full name
             # Format: projects/{project}/locations/{location}/processors/{id}
-            proc_id_only = processor_id.split('/')[-1] if processor_id else None
             processor_ids[proc["name"]] = {
-                "id": proc_id_only,
-                "full_name": processor_id,
+                "key": proc["key"],
+                "id": processor.name.split('/')[-1],
+                "full_name": processor.name,
+                "default_version": processor.default_processor_version or None,
                 "type": proc["type"],
                 "description": proc["description"]
             }
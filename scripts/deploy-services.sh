@@ -12,6 +12,16 @@ SERVICES=("intent-processor" "document-extractor" "compliance-validator" "orches
 for service in "${SERVICES[@]}"; do
     if [ -d "services/$service" ]; then
         echo "Building $service..."
+        
+        # Shared modules (profiling, ...) must be inside each build context
+        rm -rf services/$service/shared
+        cp -r services/shared services/$service/shared
+        
+        # document-extractor reads the processor registry at startup
+        if [ "$service" = "document-extractor" ]; then
+            cp processors/processor_ids.json services/$service/processor_ids.json
+        fi
+        
         cd services/$service
         
         # Build and push to Artifact Registry
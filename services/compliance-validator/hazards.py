@@ -0,0 +1,205 @@
+"""Local hazard-zone lookups for compliance triggers
+
+Zone polygons are loaded at startup from GeoJSON files in HAZARD_ZONES_DIR
+(default: hazard_zones/ next to this module). Each feature needs a "hazard"
+property (e.g. "seismic_zone", "flood_zone", "fire_hazard_zone"); when it is
+missing the file name is used, so seismic_zone.geojson can hold plain
+polygons. An optional "name" property is reported back to callers.
+
+Polygons are bucketed by a fixed lat/lng grid, so a lookup only runs
+point-in-polygon tests against the few zones whose cells and bounding boxes
+contain the point. Addresses are resolved locally - explicit coordinates
+first, then ZIP code centroids from zip_centroids.csv (zip,latitude,longitude)
+in the same directory - through an LRU cache. No external GIS calls are made.
+"""
+
+import csv
+import json
+import logging
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HAZARD_ZONES_DIR = os.environ.get(
+    'HAZARD_ZONES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hazard_zones')
+)
+GRID_DEGREES = float(os.environ.get('HAZARD_GRID_DEGREES', 0.25))
+GEOCODE_CACHE_SIZE = int(os.environ.get('GEOCODE_CACHE_SIZE', 10000))
+
+_ZIP = re.compile(r'\b(9(?:[0-5]\d{3}|6[01]\d{2}))(?:-\d{4})?\b')  # California ZIPs are 90000-96199
+_STATE_ZIP = re.compile(r'\b(?:CA|CALIFORNIA)\s+(9(?:[0-5]\d{3}|6[01]\d{2}))(?:-\d{4})?\b')
+
+class Zone:
+    __slots__ = ("hazard", "name", "rings", "bbox")
+
+    def __init__(self, hazard: str, name: Optional[str], rings: List[List[Tuple[float, float]]]):
+        # rings[0] is the outer boundary, the rest are holes; points are (lng, lat)
+        self.hazard = hazard
+        self.name = name
+        self.rings = rings
+        xs = [x for x, _ in rings[0]]
+        ys = [y for _, y in rings[0]]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, lng: float, lat: float) -> bool:
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x <= lng <= max_x and min_y <= lat <= max_y):
+            return False
+        if not _in_ring(lng, lat, self.rings[0]):
+            return False
+        return not any(_in_ring(lng, lat, hole) for hole in self.rings[1:])
+
+def _in_ring(x: float, y: float, ring) -> bool:
+    """Even-odd ray casting"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+class HazardZoneIndex:
+    """Grid-bucketed polygon index answering point-in-zone queries"""
+
+    def __init__(self, grid_degrees: float = GRID_DEGREES):
+        self.grid_degrees = grid_degrees
+        self.zones: List[Zone] = []
+        self.hazards = set()
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+
+    def _cell(self, lng: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lng / self.grid_degrees), math.floor(lat / self.grid_degrees)
+
+    def add(self, zone: Zone):
+        zone_id = len(self.zones)
+        self.zones.append(zone)
+        self.hazards.add(zone.hazard)
+        min_x, min_y, max_x, max_y = zone.bbox
+        (cx0, cy0), (cx1, cy1) = self._cell(min_x, min_y), self._cell(max_x, max_y)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self._cells.setdefault((cx, cy), []).append(zone_id)
+
+    def lookup(self, lat: float, lng: float) -> List[Zone]:
+        return [
+            self.zones[zone_id]
+            for zone_id in self._cells.get(self._cell(lng, lat), ())
+            if self.zones[zone_id].contains(lng, lat)
+        ]
+
+    def load_geojson(self, path: str) -> int:
+        default_hazard = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("type") == "FeatureCollection":
+            features = data.get("features", [])
+        elif data.get("type") == "Feature":
+            features = [data]
+        else:
+            features = [{"geometry": data}]  # bare geometry
+        loaded = 0
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            properties = feature.get("properties") or {}
+            hazard = properties.get("hazard", default_hazard)
+            name = properties.get("name")
+            if geometry.get("type") == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                continue
+            for polygon in polygons:
+                rings = [[(float(x), float(y)) for x, y, *_ in ring] for ring in polygon]
+                self.add(Zone(hazard, name, rings))
+                loaded += 1
+        return loaded
+
+    def stats(self) -> Dict:
+        hazards = {}
+        for zone in self.zones:
+            hazards[zone.hazard] = hazards.get(zone.hazard, 0) + 1
+        return {"zones": len(self.zones), "cells": len(self._cells), "by_hazard": hazards}
+
+def _load_index(directory: str) -> HazardZoneIndex:
+    index = HazardZoneIndex()
+    if not os.path.isdir(directory):
+        logger.warning("No hazard zone directory at %s; zone triggers disabled", directory)
+        return index
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith((".geojson", ".json")):
+            count = index.load_geojson(os.path.join(directory, filename))
+            logger.info("Loaded %s hazard zones from %s", count, filename)
+    return index
+
+def _load_zip_centroids(directory: str) -> Dict[str, Tuple[float, float]]:
+    path = os.path.join(directory, "zip_centroids.csv")
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as f:
+        return {
+            row["zip"].strip(): (float(row["latitude"]), float(row["longitude"]))
+            for row in csv.DictReader(f)
+        }
+
+# Loaded once at startup
+zone_index = _load_index(HAZARD_ZONES_DIR)
+zip_centroids = _load_zip_centroids(HAZARD_ZONES_DIR)
+
+def normalize_address(address: str) -> str:
+    return " ".join(re.sub(r"[^\w\s-]", " ", address.upper()).split())
+
+@lru_cache(maxsize=GEOCODE_CACHE_SIZE)
+def geocode(normalized_address: str) -> Optional[Tuple[float, float]]:
+    """Resolve a normalized address to (lat, lng) from local data only"""
+    # The ZIP follows the state; otherwise take the last candidate, since the
+    # first 5-digit number is usually the house number
+    matches = _STATE_ZIP.findall(normalized_address) or _ZIP.findall(normalized_address)
+    if matches:
+        return zip_centroids.get(matches[-1])
+    return None
+
+def resolve_location(details: Dict) -> Tuple[Optional[Tuple[float, float]], str]:
+    """(lat, lng) and how it was found, from coordinates or the address"""
+    lat = details.get("latitude", details.get("lat"))
+    lng = details.get("longitude", details.get("lng", details.get("lon")))
+    if lat is not None and lng is not None:
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return None, "invalid_coordinates"
+        if -90 <= lat <= 90 and -180 <= lng <= 180:
+            return (round(lat, 6), round(lng, 6)), "coordinates"
+        return None, "invalid_coordinates"
+
+    address = details.get("address")
+    if address:
+        location = geocode(normalize_address(str(address)))
+        return location, "zip_centroid" if location else "unresolved_address"
+    return None, "no_location"
+
+def hazard_zones_for(details: Dict) -> Dict:
+    """Zones containing the property described by `details`"""
+    location, source = resolve_location(details)
+    zones = zone_index.lookup(*location) if location else []
+    return {
+        "location": {"latitude": location[0], "longitude": location[1]} if location else None,
+        "location_source": source,
+        "zones": [{"hazard": zone.hazard, "name": zone.name} for zone in zones],
+        "hazards": sorted({zone.hazard for zone in zones})
+    }
+
+def lookup_stats() -> Dict:
+    cache = geocode.cache_info()
+    return {
+        **zone_index.stats(),
+        "zip_centroids": len(zip_centroids),
+        "geocode_cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize}
+    }
@@ -3,13 +3,20 @@ import json
 from flask import Flask, request, jsonify
 from datetime import datetime
 import logging
+from shared.profiling import register_flask
+from shared.structured_logging import configure_logging, track_trace_flask
+from hazards import hazard_zones_for, lookup_stats, zone_index
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Structured JSON logs, written off the request thread
+configure_logging("compliance-validator")
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# On-demand profiling endpoints, enabled by DEBUG_TOKEN
+register_flask(app)
+track_trace_flask(app)
+
 # California Real Estate Compliance Rules
 COMPLIANCE_RULES = {
     "lead_paint": {
@@ -41,7 +48,11 @@ COMPLIANCE_RULES = {
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "service": "compliance-validator"}), 200
+    return jsonify({
+        "status": "healthy",
+        "service": "compliance-validator",
+        "hazard_index": lookup_stats()
+    }), 200
 
 @app.route('/validate', methods=['POST'])
 def validate_compliance():
@@ -68,7 +79,7 @@ def validate_compliance():
                 "reason": "Property built before 1978 - Federal requirement",
                 "priority": "mandatory"
             })
-            logger.info(f"Lead paint disclosure required for property built in {built_year}")
+            logger.info("Lead paint disclosure required for property built in %s", built_year)
         
         # Check price-based requirements
         price = property_details.get('price')
@@ -78,13 +89,50 @@ def validate_compliance():
                 "reason": "High-value property may benefit from additional protections"
             })
         
-        # Natural hazard disclosure (all CA properties)
+        # Natural hazard disclosure (all CA properties), naming any zones the property is in
+        hazard_lookup = hazard_zones_for(property_details)
+        compliance_response["hazard_zones"] = hazard_lookup
+        zone_names = [zone["name"] or zone["hazard"] for zone in hazard_lookup["zones"]]
         compliance_response["required_forms"].append({
             "form": "natural_hazard_disclosure",
-            "reason": "Required for all California properties",
+            "reason": "Required for all California properties" + (
+                f" - property is in: {', '.join(zone_names)}" if zone_names else ""
+            ),
             "priority": "mandatory"
         })
         
+        # Earthquake disclosure for properties inside a seismic hazard zone
+        if "seismic_zone" in hazard_lookup["hazards"]:
+            compliance_response["required_forms"].append({
+                "form": "earthquake_disclosure",
+                "reason": COMPLIANCE_RULES["earthquake"]["description"],
+                "priority": "mandatory"
+            })
+        elif not zone_index.zones:
+            compliance_response["warnings"].append({
+                "type": "hazard_data_unavailable",
+                "message": "No hazard zone data loaded; seismic and hazard zones were not checked"
+            })
+        elif "seismic_zone" not in zone_index.hazards:
+            compliance_response["warnings"].append({
+                "type": "seismic_data_unavailable",
+                "message": "No seismic zone data loaded; earthquake disclosure was not checked"
+            })
+        elif hazard_lookup["location"] is None:
+            compliance_response["warnings"].append({
+                "type": "location_unresolved",
+                "message": "Could not locate property; seismic and hazard zones were not checked",
+                "source": hazard_lookup["location_source"]
+            })
+        elif hazard_lookup["location_source"] == "zip_centroid":
+            # A ZIP centroid outside a zone says nothing about a property near the zone's edge
+            compliance_response["warnings"].append({
+                "type": "approximate_location",
+                "message": "Property located by ZIP code centroid only; confirm it is outside seismic "
+                           "hazard zones or provide coordinates before omitting the earthquake disclosure",
+                "source": hazard_lookup["location_source"]
+            })
+        
         # Add standard California disclosures
         standard_forms = [
             "transfer_disclosure_statement",
@@ -133,7 +181,7 @@ def validate_compliance():
         return jsonify(compliance_response), 200
         
     except Exception as e:
-        logger.error(f"Error in compliance validation: {str(e)}")
+        logger.error("Error in compliance validation: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/check_triggers', methods=['POST'])
@@ -154,12 +202,21 @@ def check_triggers():
                 "details": COMPLIANCE_RULES["lead_paint"]
             })
         
+        hazard_lookup = hazard_zones_for(property_details)
+        if "seismic_zone" in hazard_lookup["hazards"]:
+            triggered_rules.append({
+                "rule": "earthquake",
+                "triggered": True,
+                "details": COMPLIANCE_RULES["earthquake"]
+            })
+        
         # All California properties trigger certain rules
         triggered_rules.extend([
             {
                 "rule": "natural_hazard",
                 "triggered": True,
-                "details": COMPLIANCE_RULES["natural_hazard"]
+                "details": COMPLIANCE_RULES["natural_hazard"],
+                "zones": hazard_lookup["zones"]
             },
             {
                 "rule": "smoke_detector",
@@ -175,12 +232,31 @@ def check_triggers():
         
         return jsonify({
             "property_details": property_details,
+            "hazard_zones": hazard_lookup,
             "triggered_rules": triggered_rules,
             "total_triggers": len(triggered_rules)
         }), 200
         
     except Exception as e:
-        logger.error(f"Error checking triggers: {str(e)}")
+        logger.error("Error checking triggers: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/hazard_zones', methods=['POST'])
+def lookup_hazard_zones():
+    """Bulk point-in-zone lookup for many properties at once"""
+    try:
+        data = request.get_json()
+        locations = data.get('locations')
+        if locations is None:
+            locations = [data.get('property_details', {})]
+        
+        return jsonify({
+            "results": [hazard_zones_for(location) for location in locations],
+            "total": len(locations)
+        }), 200
+        
+    except Exception as e:
+        logger.error("Error looking up hazard zones: %s", e)
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
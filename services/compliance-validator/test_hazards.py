@@ -0,0 +1,56 @@
+"""Hazard-zone geometry and local geocoding"""
+
+import json
+
+import pytest
+
+import hazards
+from hazards import HazardZoneIndex, Zone, geocode, normalize_address
+
+SQUARE = [(-118.0, 33.0), (-117.0, 33.0), (-117.0, 34.0), (-118.0, 34.0), (-118.0, 33.0)]
+HOLE = [(-117.6, 33.4), (-117.4, 33.4), (-117.4, 33.6), (-117.6, 33.6), (-117.6, 33.4)]
+
+def test_zone_contains_respects_bbox_and_holes():
+    zone = Zone("seismic_zone", None, [SQUARE, HOLE])
+    assert zone.bbox == (-118.0, 33.0, -117.0, 34.0)
+    assert zone.contains(-117.8, 33.2)
+    assert not zone.contains(-117.5, 33.5)   # inside the hole
+    assert not zone.contains(-116.5, 33.5)   # outside the bbox
+    assert not zone.contains(-117.5, 34.5)
+
+def test_zone_contains_concave_polygon():
+    # L shape: the notch at the top right is inside the bbox but outside the zone
+    l_shape = [(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2), (0, 0)]
+    zone = Zone("flood_zone", None, [l_shape])
+    assert zone.contains(0.5, 1.5)
+    assert not zone.contains(1.5, 1.5)
+
+def test_index_loads_geojson_and_looks_up(tmp_path):
+    path = tmp_path / "seismic_zone.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [{
+        "type": "Feature",
+        "properties": {"name": "Test Fault Zone"},
+        "geometry": {"type": "Polygon", "coordinates": [[list(p) for p in SQUARE]]}
+    }]}))
+    index = HazardZoneIndex(grid_degrees=0.25)
+    assert index.load_geojson(str(path)) == 1
+    assert [(z.hazard, z.name) for z in index.lookup(33.2, -117.8)] == [("seismic_zone", "Test Fault Zone")]
+    assert index.lookup(35.0, -117.8) == []
+
+@pytest.fixture
+def centroids(monkeypatch):
+    monkeypatch.setattr(hazards, "zip_centroids", {"91234": (34.2, -118.6), "90265": (34.03, -118.78)})
+    geocode.cache_clear()
+    yield
+    geocode.cache_clear()
+
+@pytest.mark.parametrize("address", [
+    "91234 Pacific Coast Hwy, Malibu CA 90265",
+    "91234 Pacific Coast Hwy, Malibu, California 90265-1234",
+    "91234 Pacific Coast Hwy, Malibu 90265",
+])
+def test_geocode_uses_zip_not_house_number(centroids, address):
+    assert geocode(normalize_address(address)) == (34.03, -118.78)
+
+def test_geocode_ignores_non_california_zip(centroids):
+    assert geocode(normalize_address("1 Main St, Reno NV 96500")) is None
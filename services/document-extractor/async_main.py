@@ -0,0 +1,262 @@
+"""Document Extractor - async serving mode
+
+Same endpoints as main.py, but built on the async Document AI client so one
+worker can hold many Document AI requests in flight at once.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker -b :$PORT async_main:app
+
+Tuning (environment):
+    DOCAI_MAX_CONCURRENCY          in-flight requests per processor (default 8)
+    DOCAI_CONCURRENCY_<KEY>        per-processor override, e.g. DOCAI_CONCURRENCY_CA_RPA=4
+    DOCAI_MAX_WAITING              requests allowed to queue per processor (default 2x concurrency)
+    DOCAI_QUOTA_PER_MINUTE         process requests/minute quota per processor (default 120)
+    DOCAI_QUOTA_HEADROOM           fraction of quota at which we start shedding (default 0.9)
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from google.api_core.client_options import ClientOptions
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+from google.cloud import documentai_v1 as documentai
+from pydantic import BaseModel
+
+from extraction import (
+    API_ENDPOINT,
+    build_process_request,
+    document_to_response,
+    intent_to_response,
+    processor_ids,
+    registry_path,
+    resolve_processor,
+)
+from shared.structured_logging import configure_logging, track_trace_fastapi
+
+# Structured JSON logs, written off the request thread
+configure_logging("document-extractor")
+logger = logging.getLogger(__name__)
+logger.info("Loaded %s processors from %s", len(processor_ids), registry_path)
+
+app = FastAPI(title="RealeAgent Document Extractor")
+track_trace_fastapi(app)
+
+MAX_CONCURRENCY = int(os.environ.get('DOCAI_MAX_CONCURRENCY', 8))
+MAX_WAITING = os.environ.get('DOCAI_MAX_WAITING')
+QUOTA_PER_MINUTE = int(os.environ.get('DOCAI_QUOTA_PER_MINUTE', 120))
+QUOTA_HEADROOM = float(os.environ.get('DOCAI_QUOTA_HEADROOM', 0.9))
+DISCONNECT_POLL_SECONDS = 0.5
+QUOTA_WINDOW_SECONDS = 60.0
+# Pause after Document AI itself reports the quota exhausted (other instances share it)
+THROTTLE_PAUSE_SECONDS = float(os.environ.get('DOCAI_THROTTLE_PAUSE_SECONDS', 5))
+MAX_THROTTLE_PAUSE_SECONDS = 60.0
+
+class _Reservation:
+    """A wait-queue place taken synchronously by the handler, before its task starts"""
+    __slots__ = ("active",)
+
+    def __init__(self):
+        self.active = True
+
+class ProcessorGate:
+    """Concurrency semaphore plus quota-window backpressure for one processor"""
+
+    def __init__(self, key: str, concurrency: int, max_waiting: int,
+                 quota_per_minute: int, headroom: float):
+        self.key = key
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.quota_limit = max(1, math.floor(quota_per_minute * headroom))
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._consecutive_throttles = 0
+        self._paused_until = 0.0
+        self._calls = deque()  # monotonic start times within the quota window
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0] >= QUOTA_WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def retry_after(self) -> Optional[int]:
+        """Seconds the caller should back off for, or None if the request may proceed"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return max(1, math.ceil(self._paused_until - now))
+        self._trim(now)
+        if len(self._calls) + self.waiting >= self.quota_limit:
+            # Near quota: wait until the oldest call leaves the window
+            oldest = self._calls[0] if self._calls else now
+            return max(1, math.ceil(QUOTA_WINDOW_SECONDS - (now - oldest)))
+        # Reserved requests only queue once every concurrency slot is taken
+        if self.waiting + self.in_flight - self.concurrency >= self.max_waiting:
+            return 1
+        return None
+
+    def throttle(self) -> int:
+        """Document AI rejected a call for quota: pause admissions, doubling on repeats"""
+        self.throttled += 1
+        pause = min(MAX_THROTTLE_PAUSE_SECONDS, THROTTLE_PAUSE_SECONDS * 2 ** self._consecutive_throttles)
+        self._consecutive_throttles += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        return max(1, math.ceil(self._paused_until - time.monotonic()))
+
+    def succeeded(self):
+        self._consecutive_throttles = 0
+
+    def reserve(self) -> _Reservation:
+        """Count the request as waiting now, so a burst in one loop tick sees it in retry_after()"""
+        self.waiting += 1
+        return _Reservation()
+
+    def release_reservation(self, reservation: _Reservation):
+        """Idempotent; also covers a task cancelled before it ever reached slot()"""
+        if reservation.active:
+            reservation.active = False
+            self.waiting -= 1
+
+    @asynccontextmanager
+    async def slot(self, reservation: _Reservation):
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.release_reservation(reservation)
+        self._calls.append(time.monotonic())
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def stats(self) -> Dict:
+        self._trim(time.monotonic())
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls_last_minute": len(self._calls),
+            "quota_limit": self.quota_limit,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 1))
+        }
+
+def _build_gates() -> Dict[str, ProcessorGate]:
+    gates = {}
+    for key in processor_ids:
+        concurrency = int(os.environ.get(f"DOCAI_CONCURRENCY_{key.upper()}", MAX_CONCURRENCY))
+        max_waiting = int(MAX_WAITING) if MAX_WAITING else 2 * concurrency
+        gates[key] = ProcessorGate(key, concurrency, max_waiting, QUOTA_PER_MINUTE, QUOTA_HEADROOM)
+    return gates
+
+gates = _build_gates()
+_client: Optional[documentai.DocumentProcessorServiceAsyncClient] = None
+
+def get_client() -> documentai.DocumentProcessorServiceAsyncClient:
+    """Create the async client lazily so it binds to the serving event loop"""
+    global _client
+    if _client is None:
+        _client = documentai.DocumentProcessorServiceAsyncClient(
+            client_options=ClientOptions(api_endpoint=API_ENDPOINT)
+        )
+    return _client
+
+class ExtractRequest(BaseModel):
+    document_content: Optional[str] = None  # Base64 encoded
+    document_type: str = 'form_parser'
+    mime_type: str = 'application/pdf'
+
+class ExtractFromIntentRequest(BaseModel):
+    intent_data: Dict = {}
+
+async def _cancel_on_disconnect(http_request: Request, task: asyncio.Task):
+    """Cancel the Document AI call if the client goes away before it finishes"""
+    while not task.done():
+        if await http_request.is_disconnected():
+            task.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "service": "document-extractor",
+        "mode": "async",
+        "processors": {key: gate.stats() for key, gate in gates.items()}
+    }
+
+@app.post("/extract")
+async def extract_document(body: ExtractRequest, http_request: Request):
+    if not body.document_content:
+        return JSONResponse({"error": "No document content provided"}, status_code=400)
+
+    processor_key, processor_id, processor_name = resolve_processor(body.document_type)
+    gate = gates[processor_key]
+
+    retry_after = gate.retry_after()
+    if retry_after is not None:
+        gate.rejected += 1
+        logger.warning("Shedding request for %s: retry in %ss", processor_key, retry_after)
+        return JSONResponse(
+            {"error": f"Processor {processor_key} is at capacity, retry later"},
+            status_code=429,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    reservation = gate.reserve()
+
+    async def run():
+        async with gate.slot(reservation):
+            logger.info("Processing document with processor: %s", processor_name)
+            request_obj = build_process_request(processor_name, body.document_content, body.mime_type)
+            return await get_client().process_document(request=request_obj)
+
+    task = asyncio.create_task(run())
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, task))
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        logger.info("Client disconnected, cancelled request to %s", processor_key)
+        # 499: client closed request; nobody is listening for the body
+        return JSONResponse({"error": "Client disconnected"}, status_code=499)
+    except (ResourceExhausted, TooManyRequests) as e:
+        # The project quota is shared with every other instance, so this can fire below our own window
+        retry_after = gate.throttle()
+        logger.warning("Document AI quota exhausted for %s, pausing %ss: %s", processor_key, retry_after, e)
+        return JSONResponse(
+            {"error": f"Processor {processor_key} quota exhausted, retry later"},
+            status_code=429,
+            headers={"Retry-After": str(retry_after)}
+        )
+    except Exception as e:
+        logger.error("Error processing document: %s", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        watcher.cancel()
+        gate.release_reservation(reservation)
+
+    gate.succeeded()
+    return document_to_response(result.document, processor_id)
+
+@app.post("/extract_from_intent")
+async def extract_from_intent(body: ExtractFromIntentRequest):
+    """Extract data based on intent processor output"""
+    try:
+        return intent_to_response(body.intent_data)
+    except Exception as e:
+        logger.error("Error in extract_from_intent: %s", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
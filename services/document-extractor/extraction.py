@@ -0,0 +1,127 @@
+"""Document AI helpers shared by the sync (main.py) and async (async_main.py) apps"""
+
+import json
+import os
+from google.cloud import documentai_v1 as documentai
+
+LOCATION = 'us'  # Document AI uses 'us' not 'us-central1'
+API_ENDPOINT = f"{LOCATION}-documentai.googleapis.com"
+
+# Registry written by processors/create_processors_fixed.py. Deploys copy it next
+# to this module; local runs fall back to the copy in the repo's processors/ dir.
+_HERE = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_PATHS = [
+    os.environ.get('PROCESSOR_REGISTRY', ''),
+    os.path.join(_HERE, 'processor_ids.json'),
+    os.path.join(_HERE, '..', '..', 'processors', 'processor_ids.json')
+]
+
+def load_processor_registry():
+    """Return (path, {key: resource name}) from the first registry file found
+
+    The resource name points at the processor's pinned default version when
+    the registry recorded one, so a retrain does not silently change output.
+    Raises RuntimeError when no registry is found or it has no form parser,
+    so a misconfigured deploy fails at startup instead of serving stale IDs.
+    """
+    for path in REGISTRY_PATHS:
+        if not path or not os.path.exists(path):
+            continue
+        with open(path) as f:
+            registry = json.load(f)
+        names = {}
+        for entry in registry.values():
+            if entry.get('key') and entry.get('full_name'):
+                names[entry['key']] = entry.get('default_version') or entry['full_name']
+        if 'form_parser' not in names:
+            raise RuntimeError(f"Processor registry {path} has no form_parser entry")
+        return path, names
+
+    searched = ', '.join(path for path in REGISTRY_PATHS if path)
+    raise RuntimeError(f"No processor registry found (searched {searched}); run `make processors`")
+
+def _processor_id(resource_name: str) -> str:
+    # .../processors/{id} or .../processors/{id}/processorVersions/{version}
+    parts = resource_name.split('/')
+    return parts[parts.index('processors') + 1]
+
+# Loaded once at startup
+registry_path, processor_names = load_processor_registry()
+processor_ids = {key: _processor_id(name) for key, name in processor_names.items()}
+
+# Map form types to processor types
+FORM_TYPE_MAPPING = {
+    "purchase_agreement": "ca_rpa",
+    "lead_paint_disclosure": "lead_paint",
+    "inspection_advisory": "bia"
+}
+
+def resolve_processor(document_type: str):
+    """Return (processor_key, processor_id, processor_name), falling back to the form parser"""
+    if document_type not in processor_names:
+        document_type = 'form_parser'
+    return document_type, processor_ids[document_type], processor_names[document_type]
+
+def build_process_request(processor_name: str, document_content, mime_type: str):
+    """Build a ProcessRequest for a raw document"""
+    return documentai.ProcessRequest(
+        name=processor_name,
+        raw_document=documentai.RawDocument(
+            content=document_content,
+            mime_type=mime_type
+        )
+    )
+
+def document_to_response(document, processor_id: str) -> dict:
+    """Flatten a processed Document into the /extract response body"""
+    # Extract entities
+    entities = []
+    for entity in document.entities:
+        entities.append({
+            "type": entity.type_,
+            "text": entity.mention_text,
+            "confidence": entity.confidence,
+            "normalized_value": entity.normalized_value.text if entity.normalized_value else None
+        })
+
+    # Extract form fields
+    form_fields = []
+    for page in document.pages:
+        for form_field in page.form_fields:
+            field_name = form_field.field_name.text_anchor.content if form_field.field_name else ""
+            field_value = form_field.field_value.text_anchor.content if form_field.field_value else ""
+            form_fields.append({
+                "name": field_name,
+                "value": field_value,
+                "confidence": form_field.field_name.confidence if form_field.field_name else 0
+            })
+
+    return {
+        "success": True,
+        "processor_used": processor_id,
+        "text": document.text,
+        "entities": entities,
+        "form_fields": form_fields,
+        "page_count": len(document.pages)
+    }
+
+def intent_to_response(intent_data: dict) -> dict:
+    """Build the /extract_from_intent response from intent processor output"""
+    form_type = intent_data.get('form_type', 'purchase_agreement')
+    document_type = FORM_TYPE_MAPPING.get(form_type, 'form_parser')
+
+    # For now, return structured data based on intent
+    # In production, this would process actual documents
+    return {
+        "success": True,
+        "form_type": form_type,
+        "processor_type": document_type,
+        "extracted_data": {
+            "property_address": intent_data.get('property_address'),
+            "price": intent_data.get('price'),
+            "built_year": intent_data.get('built_year'),
+            "escrow_days": intent_data.get('escrow_days'),
+            "contingencies": intent_data.get('contingencies', [])
+        },
+        "requires_lead_paint": intent_data.get('built_year', 2000) < 1978
+    }
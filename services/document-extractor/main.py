@@ -4,27 +4,31 @@ from flask import Flask, request, jsonify
 from google.cloud import documentai_v1 as documentai
 from google.api_core.client_options import ClientOptions
 import logging
+from extraction import (
+    API_ENDPOINT,
+    build_process_request,
+    document_to_response,
+    intent_to_response,
+    processor_names,
+    registry_path,
+    resolve_processor,
+)
+from shared.profiling import register_flask
+from shared.structured_logging import configure_logging, track_trace_flask
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Structured JSON logs, written off the request thread
+configure_logging("document-extractor")
 logger = logging.getLogger(__name__)
+logger.info("Loaded %s processors from %s", len(processor_names), registry_path)
 
 app = Flask(__name__)
 
-# Initialize Document AI client
-PROJECT_ID = os.environ.get('PROJECT_ID', 'realeagent-vertex-ai')
-LOCATION = 'us'  # Document AI uses 'us' not 'us-central1'
-
-# Load processor IDs
-processor_ids = {
-    "lead_paint": "9de800b942d80f79",
-    "ca_rpa": "2d7566c3aec1205f",
-    "bia": "65fb7aab83dd5495",
-    "form_parser": "9de800b942d80ad1"
-}
+# On-demand profiling endpoints, enabled by DEBUG_TOKEN
+register_flask(app)
+track_trace_flask(app)
 
 # Initialize Document AI client
-opts = ClientOptions(api_endpoint=f"{LOCATION}-documentai.googleapis.com")
+opts = ClientOptions(api_endpoint=API_ENDPOINT)
 client = documentai.DocumentProcessorServiceClient(client_options=opts)
 
 @app.route('/health', methods=['GET'])
@@ -45,67 +49,22 @@ def extract_document():
             return jsonify({"error": "No document content provided"}), 400
         
         # Get processor ID
-        processor_id = processor_ids.get(document_type, processor_ids['form_parser'])
-        processor_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/processors/{processor_id}"
+        _, processor_id, processor_name = resolve_processor(document_type)
         
-        logger.info(f"Processing document with processor: {processor_name}")
-        
-        # Create document object
-        document = documentai.Document(
-            content=document_content,
-            mime_type=mime_type
-        )
+        logger.info("Processing document with processor: %s", processor_name)
         
         # Create request
-        request_obj = documentai.ProcessRequest(
-            name=processor_name,
-            raw_document=documentai.RawDocument(
-                content=document_content,
-                mime_type=mime_type
-            )
-        )
+        request_obj = build_process_request(processor_name, document_content, mime_type)
         
         # Process document
         result = client.process_document(request=request_obj)
         
-        # Extract entities
-        entities = []
-        for entity in result.document.entities:
-            entities.append({
-                "type": entity.type_,
-                "text": entity.mention_text,
-                "confidence": entity.confidence,
-                "normalized_value": entity.normalized_value.text if entity.normalized_value else None
-            })
-        
-        # Extract form fields
-        form_fields = []
-        for page in result.document.pages:
-            for form_field in page.form_fields:
-                field_name = form_field.field_name.text_anchor.content if form_field.field_name else ""
-                field_value = form_field.field_value.text_anchor.content if form_field.field_value else ""
-                form_fields.append({
-                    "name": field_name,
-                    "value": field_value,
-                    "confidence": form_field.field_name.confidence if form_field.field_name else 0
-                })
-        
-        # Extract text
-        text = result.document.text
-        
-        response = {
-            "success": True,
-            "processor_used": processor_id,
-            "text": text,
-            "entities": entities,
-            "form_fields": form_fields,
-            "page_count": len(result.document.pages)
-        }
+        response = document_to_response(result.document, processor_id)
         
         return jsonify(response), 200
         
     except Exception as e:
-        logger.error(f"Error processing document: {str(e)}")
+        logger.error("Error processing document: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/extract_from_intent', methods=['POST'])
@@ -115,36 +74,12 @@ def extract_from_intent():
         data = request.get_json()
         intent_data = data.get('intent_data', {})
         
-        # Map form types to processor types
-        form_type_mapping = {
-            "purchase_agreement": "ca_rpa",
-            "lead_paint_disclosure": "lead_paint",
-            "inspection_advisory": "bia"
-        }
-        
-        form_type = intent_data.get('form_type', 'purchase_agreement')
-        document_type = form_type_mapping.get(form_type, 'form_parser')
-        
-        # For now, return structured data based on intent
-        # In production, this would process actual documents
-        response = {
-            "success": True,
-            "form_type": form_type,
-            "processor_type": document_type,
-            "extracted_data": {
-                "property_address": intent_data.get('property_address'),
-                "price": intent_data.get('price'),
-                "built_year": intent_data.get('built_year'),
-                "escrow_days": intent_data.get('escrow_days'),
-                "contingencies": intent_data.get('contingencies', [])
-            },
-            "requires_lead_paint": intent_data.get('built_year', 2000) < 1978
-        }
+        response = intent_to_response(intent_data)
         
         return jsonify(response), 200
         
     except Exception as e:
-        logger.error(f"Error in extract_from_intent: {str(e)}")
+        logger.error("Error in extract_from_intent: %s", e)
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
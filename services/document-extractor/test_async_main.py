@@ -0,0 +1,47 @@
+"""Backpressure tests for the async serving mode, using a fake Document AI client"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import async_main
+
+class SlowClient:
+    async def process_document(self, request):
+        await asyncio.sleep(0.2)
+        return SimpleNamespace(document=SimpleNamespace(text="", entities=[], pages=[]))
+
+@pytest.fixture
+def one_slot_gate(monkeypatch):
+    gate = async_main.ProcessorGate("form_parser", concurrency=1, max_waiting=1,
+                                    quota_per_minute=1000, headroom=1.0)
+    monkeypatch.setitem(async_main.gates, "form_parser", gate)
+    monkeypatch.setattr(async_main, "_client", SlowClient())
+    monkeypatch.setattr(async_main, "document_to_response", lambda document, processor_id: {"success": True})
+    return gate
+
+async def _burst(count):
+    transport = httpx.ASGITransport(app=async_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/extract", json={"document_content": "aGk="}) for _ in range(count)
+        ))
+
+def test_simultaneous_burst_is_shed(one_slot_gate):
+    responses = asyncio.run(_burst(20))
+    statuses = sorted(r.status_code for r in responses)
+    # One running plus one waiting; everything else in the same tick is shed
+    assert statuses.count(200) == 2
+    assert statuses.count(429) == 18
+    assert all(r.headers["Retry-After"] for r in responses if r.status_code == 429)
+    assert one_slot_gate.waiting == 0
+    assert one_slot_gate.in_flight == 0
+
+def test_quota_counts_reserved_requests(one_slot_gate):
+    one_slot_gate.max_waiting = 100
+    one_slot_gate.quota_limit = 3
+    statuses = sorted(r.status_code for r in asyncio.run(_burst(10)))
+    assert statuses.count(200) == 3
+    assert one_slot_gate.waiting == 0
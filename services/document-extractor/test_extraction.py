@@ -0,0 +1,33 @@
+"""Processor registry loading: a missing or incomplete registry must fail at startup"""
+
+import json
+
+import pytest
+
+import extraction
+
+FORM_PARSER = "projects/p/locations/us/processors/abc123"
+
+def _write_registry(tmp_path, entries):
+    path = tmp_path / "processor_ids.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+def test_loads_pinned_version(tmp_path, monkeypatch):
+    path = _write_registry(tmp_path, {"Form Parser": {
+        "key": "form_parser", "full_name": FORM_PARSER,
+        "default_version": FORM_PARSER + "/processorVersions/v1"
+    }})
+    monkeypatch.setattr(extraction, "REGISTRY_PATHS", [path])
+    assert extraction.load_processor_registry() == (path, {"form_parser": FORM_PARSER + "/processorVersions/v1"})
+
+def test_missing_registry_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction, "REGISTRY_PATHS", ["", str(tmp_path / "missing.json")])
+    with pytest.raises(RuntimeError, match="No processor registry"):
+        extraction.load_processor_registry()
+
+def test_registry_without_form_parser_fails(tmp_path, monkeypatch):
+    path = _write_registry(tmp_path, {"BIA": {"key": "bia", "full_name": "projects/p/locations/us/processors/b"}})
+    monkeypatch.setattr(extraction, "REGISTRY_PATHS", [path])
+    with pytest.raises(RuntimeError, match="form_parser"):
+        extraction.load_processor_registry()
@@ -1,7 +1,7 @@
 """Intent Processor Service - Natural Language Understanding"""
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Dict, List, Optional
 import vertexai
 from vertexai.generative_models import GenerativeModel
@@ -9,22 +9,50 @@ import json
 import os
 import logging
 import re
+from shared.profiling import register_fastapi
+from shared.structured_logging import configure_logging, logging_stats, payload, track_trace_fastapi
+from prompts import INTENT_EXTRACTION, TokenLedger, build_context_cache, registry, usage_from_response
+from similarity import NearDuplicateIndex
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Structured JSON logs, written off the request thread
+configure_logging("intent-processor")
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="RealeAgent Intent Processor")
 
+# On-demand profiling endpoints, enabled by DEBUG_TOKEN
+register_fastapi(app)
+track_trace_fastapi(app)
+
 # Initialize Vertex AI
 PROJECT_ID = os.getenv("PROJECT_ID", "realeagent-vertex-ai")
 LOCATION = os.getenv("REGION", "us-central1")
 vertexai.init(project=PROJECT_ID, location=LOCATION)
 
-# Initialize model
-model = GenerativeModel("gemini-2.5-pro")
-model_name = "gemini-2.5-pro"
-logger.info(f"Successfully initialized model: {model_name}")
+# Initialize model cascade: cheapest tier first, last tier is the fallback of record
+MODEL_CASCADE = [
+    name.strip()
+    for name in os.getenv("MODEL_CASCADE", "gemini-2.5-flash,gemini-2.5-pro").split(",")
+    if name.strip()
+]
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", 0.8))
+model_tiers = [(name, GenerativeModel(name)) for name in MODEL_CASCADE]
+model_name = MODEL_CASCADE[-1]
+logger.info("Successfully initialized model cascade: %s", " -> ".join(MODEL_CASCADE))
+
+# Static prompt prefixes are cached model-side where supported (PROMPT_CACHE=vertex|local|off)
+context_cache = build_context_cache()
+if context_cache is not None:
+    # Cache decisions need each prefix's size in every tier's tokenizer; count them all now, not per request
+    registry.count_prefixes(model_tiers)
+token_ledger = TokenLedger()
+
+# Recent queries, so rephrasings of the same request reuse the prior extraction
+query_index = NearDuplicateIndex(
+    threshold=float(os.getenv("NEAR_DUP_THRESHOLD", 0.7)),
+    max_entries=int(os.getenv("NEAR_DUP_MAX_ENTRIES", 5000)),
+    ttl_seconds=float(os.getenv("NEAR_DUP_TTL_SECONDS", 3600))
+)
 
 class IntentRequest(BaseModel):
     user_input: str
@@ -38,6 +66,7 @@ class IntentResponse(BaseModel):
     escrow_days: Optional[int] = None
     contingencies: List[str] = []
     confidence: float = 0.0
+    model_tier: Optional[str] = None
 
 def extract_json_from_response(text: str) -> dict:
     """Extract JSON from response that might be wrapped in markdown"""
@@ -51,45 +80,94 @@ def extract_json_from_response(text: str) -> dict:
     
     return json.loads(json_str)
 
+def cascade_problems(user_input: str, raw_result: dict, intent: IntentResponse) -> List[str]:
+    """Reasons a cheaper tier's answer should not be trusted; empty means accept"""
+    problems = []
+    if "confidence" not in raw_result:
+        problems.append("no confidence reported")
+    elif intent.confidence < CASCADE_MIN_CONFIDENCE:
+        problems.append(f"confidence {intent.confidence} below {CASCADE_MIN_CONFIDENCE}")
+    
+    # Completeness: anything clearly mentioned in the input must have been extracted
+    text = user_input.lower()
+    if re.search(r'\$\s*\d|\d\s*(?:k|m|million)\b', text) and intent.price is None:
+        problems.append("price mentioned but not extracted")
+    if re.search(r'\bbuilt\b.*\b(1[89]|20)\d{2}\b', text) and intent.built_year is None:
+        problems.append("built year mentioned but not extracted")
+    if "escrow" in text and re.search(r'\d', text) and intent.escrow_days is None:
+        problems.append("escrow mentioned but not extracted")
+    if re.search(r'\b\d+\s+\w+.*\b(?:st|street|ave|avenue|dr|drive|rd|road|ln|lane|blvd|way|ct|court)\b', text) \
+            and not intent.property_address:
+        problems.append("address mentioned but not extracted")
+    return problems
+
 @app.post("/process")
 async def process_intent(request: IntentRequest):
     """Extract intent from natural language input"""
     
-    prompt = f"""Extract real estate transaction details from this request:
-    "{request.user_input}"
-    
-    Return a JSON object with these fields:
-    - form_type: Type of document needed (use "purchase_agreement" for purchase requests)
-    - property_address: Full property address
-    - price: Purchase price as number (no formatting, no dollar signs)
-    - built_year: Year property was built
-    - escrow_days: Number of days for escrow
-    - contingencies: Array of contingencies mentioned
-    - confidence: Confidence score 0-1
+    cached = query_index.lookup(request.user_input)
+    if cached is not None:
+        logger.info("Reusing extraction from a near-duplicate query")
+        # No model answered this request; don't report the tier that answered the original
+        cached["model_tier"] = "near_duplicate"
+        return IntentResponse(**cached)
     
-    Return ONLY the JSON object, no other text.
-    """
+    template = registry.get(INTENT_EXTRACTION)
     
-    try:
-        response = model.generate_content(prompt)
-        logger.info(f"Model response: {response.text}")
-        
-        # Parse the response (handling markdown-wrapped JSON)
-        result = extract_json_from_response(response.text)
-        
-        # Ensure all required fields exist
-        result.setdefault('form_type', 'purchase_agreement')
-        result.setdefault('contingencies', [])
-        result.setdefault('confidence', 0.9)
-        
-        return IntentResponse(**result)
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse model response: {e}")
-        logger.error(f"Raw response was: {response.text}")
-        raise HTTPException(status_code=500, detail=f"Invalid model response format: {str(e)}")
-    except Exception as e:
-        logger.error(f"Error processing request: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    for tier, (tier_name, tier_model) in enumerate(model_tiers):
+        is_last_tier = tier == len(model_tiers) - 1
+        response = None
+        try:
+            cached_model = None
+            if context_cache is not None:
+                cached_model = context_cache.model_for(
+                    template, tier_model, tier_name, registry.prefix_tokens(template, tier_name)
+                )
+            
+            if cached_model is not None:
+                # Prefix already lives in the cache; only send the per-request input
+                response = cached_model.generate_content(template.render_input(user_input=request.user_input))
+            else:
+                response = tier_model.generate_content(template.render(user_input=request.user_input))
+            
+            usage = usage_from_response(response)
+            token_ledger.record(f"{tier_name}/{template.key}", usage)
+            logger.info("Token usage for %s/%s: %s", tier_name, template.key, usage)
+            logger.info("Model response (%s): %s", tier_name, payload(response.text))
+            
+            # Parse the response (handling markdown-wrapped JSON)
+            result = extract_json_from_response(response.text)
+            raw_result = dict(result)
+            
+            # Ensure all required fields exist
+            result.setdefault('form_type', 'purchase_agreement')
+            result.setdefault('contingencies', [])
+            result.setdefault('confidence', 0.9)
+            
+            intent = IntentResponse(**result)
+            
+            if not is_last_tier:
+                problems = cascade_problems(request.user_input, raw_result, intent)
+                if problems:
+                    logger.info("Escalating from %s: %s", tier_name, "; ".join(problems))
+                    continue
+            
+            intent.model_tier = tier_name
+            query_index.add(request.user_input, intent.model_dump())
+            return intent
+        except (json.JSONDecodeError, ValidationError) as e:
+            if not is_last_tier:
+                logger.info("Escalating from %s: unusable response (%s)", tier_name, e)
+                continue
+            logger.error("Failed to parse model response: %s", e)
+            logger.error("Raw response was: %s", payload(response.text if response is not None else None, always=True))
+            raise HTTPException(status_code=500, detail=f"Invalid model response format: {str(e)}")
+        except Exception as e:
+            if not is_last_tier:
+                logger.warning("Escalating from %s after error: %s", tier_name, e)
+                continue
+            logger.error("Error processing request: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/health")
 async def health_check():
@@ -97,8 +175,13 @@ async def health_check():
         "status": "healthy", 
         "service": "intent-processor",
         "model": model_name,
+        "cascade": MODEL_CASCADE,
         "project": PROJECT_ID,
-        "location": LOCATION
+        "location": LOCATION,
+        "prompts": registry.describe(),
+        "token_usage": token_ledger.snapshot(),
+        "near_duplicate_index": query_index.stats(),
+        "logging": logging_stats()
     }
 
 @app.get("/")
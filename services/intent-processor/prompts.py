@@ -0,0 +1,295 @@
+"""Versioned prompt templates, token accounting and static-prefix caching
+
+Each template is split into a static prefix (instructions + examples) and a
+small per-request input. The prefix is identical across calls, so it is
+counted once and, where the model supports it, stored server-side with
+Vertex AI context caching; per-request calls then only send the input.
+"""
+
+import datetime
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PromptTemplate:
+    """A named, versioned prompt with a cacheable static prefix"""
+
+    def __init__(self, name: str, version: str, static_prefix: str, input_template: str):
+        self.name = name
+        self.version = version
+        self.static_prefix = static_prefix
+        self.input_template = input_template
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def render_input(self, **kwargs) -> str:
+        return self.input_template.format(**kwargs)
+
+    def render(self, **kwargs) -> str:
+        """Full prompt for models without a cached prefix"""
+        return self.static_prefix + self.render_input(**kwargs)
+
+class PromptRegistry:
+    """Holds every template version and remembers prefix token counts"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._active: Dict[str, str] = {}
+        self._prefix_tokens: Dict[Tuple[str, str], int] = {}
+
+    def register(self, template: PromptTemplate, active: bool = False):
+        self._templates.setdefault(template.name, {})[template.version] = template
+        if active or template.name not in self._active:
+            self._active[template.name] = template.version
+
+    def activate(self, name: str, version: str):
+        if version not in self._templates.get(name, {}):
+            raise KeyError(f"Unknown prompt version {name}@{version}")
+        self._active[name] = version
+
+    def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
+        return self._templates[name][version or self._active[name]]
+
+    def versions(self, name: str):
+        return sorted(self._templates.get(name, {}))
+
+    def count_prefixes(self, models):
+        """Count every registered template's static prefix once per (model name, model)
+
+        Runs at startup so request handlers never make a blocking count_tokens call.
+        """
+        for model_name, model in models:
+            for versions in self._templates.values():
+                for template in versions.values():
+                    tokens = count_tokens(model, template.static_prefix)
+                    self._prefix_tokens[(model_name, template.key)] = tokens
+                    logger.info("Prompt prefix %s is %s tokens for %s", template.key, tokens, model_name)
+
+    def prefix_tokens(self, template: PromptTemplate, model_name: str) -> int:
+        """Prefix token count from count_prefixes; an estimate if it was never counted"""
+        tokens = self._prefix_tokens.get((model_name, template.key))
+        if tokens is None:
+            return estimate_tokens(template.static_prefix)
+        return tokens
+
+    def describe(self) -> Dict:
+        return {
+            name: {
+                "active": self._active[name],
+                "versions": self.versions(name),
+                "prefix_tokens": {
+                    f"{model_name}/{key.split('@', 1)[1]}": tokens
+                    for (model_name, key), tokens in self._prefix_tokens.items()
+                    if key.startswith(f"{name}@")
+                }
+            }
+            for name in self._templates
+        }
+
+def count_tokens(model, text: str) -> int:
+    """Ask the model for an exact count; fall back to a ~4 chars/token estimate"""
+    try:
+        return model.count_tokens(text).total_tokens
+    except Exception as e:
+        logger.warning("count_tokens failed, estimating instead: %s", e)
+        return estimate_tokens(text)
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def usage_from_response(response) -> Dict[str, int]:
+    """Input/output/cached token counts reported by the model for one call"""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "input_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        "cached_tokens": getattr(usage, "cached_content_token_count", 0) or 0
+    }
+
+class TokenLedger:
+    """Running token totals per template version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, template_key: str, usage: Dict[str, int]):
+        with self._lock:
+            totals = self._totals.setdefault(
+                template_key,
+                {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+            )
+            totals["requests"] += 1
+            for field, value in usage.items():
+                totals[field] = totals.get(field, 0) + value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._totals.items()}
+
+class _PrefixBoundModel:
+    """Local stand-in for a model bound to cached content: prepends the prefix itself"""
+
+    def __init__(self, model, prefix: str, cache: "LocalContextCache"):
+        self._model = model
+        self._prefix = prefix
+        self._cache = cache
+
+    def generate_content(self, contents, **kwargs):
+        self._cache.hits += 1
+        return self._model.generate_content(self._prefix + contents, **kwargs)
+
+class LocalContextCache:
+    """In-process prefix cache with the same interface as VertexContextCache
+
+    Used for tests and local runs: callers still send only the per-request
+    input, but nothing is stored model-side.
+    """
+
+    def __init__(self):
+        self._bound: Dict[str, _PrefixBoundModel] = {}
+        self.hits = 0
+
+    def model_for(self, template: PromptTemplate, model, model_name: str, prefix_tokens: int):
+        key = f"{model_name}:{template.key}"
+        if key not in self._bound:
+            self._bound[key] = _PrefixBoundModel(model, template.static_prefix, self)
+        return self._bound[key]
+
+class VertexContextCache:
+    """Vertex AI context cache for template prefixes
+
+    Caching only applies above the model's minimum cacheable size, so
+    shorter prefixes return None and the caller sends the full prompt.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, min_tokens: int = 4096):
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}  # key -> (model, expires_at)
+        self._unsupported = set()
+        self._retry_at: Dict[str, datetime.datetime] = {}  # key -> next attempt after a transient error
+        self._failures: Dict[str, int] = {}
+
+    RETRY_BASE_SECONDS = 30
+    MAX_RETRY_SECONDS = 1800
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        """Errors that mean this model or project cannot cache, as opposed to transient failures"""
+        if isinstance(error, ImportError):
+            return True  # SDK without vertexai.preview.caching
+        try:
+            from google.api_core import exceptions
+        except ImportError:
+            return False
+        return isinstance(error, (exceptions.InvalidArgument, exceptions.FailedPrecondition,
+                                  exceptions.PermissionDenied, exceptions.NotFound))
+
+    def model_for(self, template: PromptTemplate, model, model_name: str, prefix_tokens: int):
+        if prefix_tokens < self.min_tokens:
+            return None
+        key = f"{model_name}:{template.key}"
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            if key in self._unsupported or (key in self._retry_at and now < self._retry_at[key]):
+                return None
+            entry = self._entries.get(key)
+            # Refresh a little before expiry so we never call a deleted cache
+            if entry and entry[1] - now > datetime.timedelta(seconds=60):
+                return entry[0]
+            try:
+                from vertexai.generative_models import Part
+                from vertexai.preview import caching
+                from vertexai.preview.generative_models import GenerativeModel as PreviewModel
+
+                cached = caching.CachedContent.create(
+                    model_name=model_name,
+                    contents=[Part.from_text(template.static_prefix)],
+                    ttl=self.ttl,
+                    display_name=template.key
+                )
+                bound = PreviewModel.from_cached_content(cached_content=cached)
+            except Exception as e:
+                if self._is_permanent(e):
+                    logger.warning("Context caching unavailable for %s: %s", key, e)
+                    self._unsupported.add(key)
+                    return None
+                # Network blips, 5xx and quota errors: back off and try again later
+                failures = self._failures.get(key, 0) + 1
+                self._failures[key] = failures
+                delay = min(self.MAX_RETRY_SECONDS, self.RETRY_BASE_SECONDS * 2 ** (failures - 1))
+                self._retry_at[key] = now + datetime.timedelta(seconds=delay)
+                logger.warning("Context cache creation for %s failed, retrying in %ss: %s", key, delay, e)
+                return None
+            self._failures.pop(key, None)
+            self._retry_at.pop(key, None)
+            self._entries[key] = (bound, now + self.ttl)
+            logger.info("Cached prompt prefix %s (%s tokens)", key, prefix_tokens)
+            return bound
+
+def build_context_cache():
+    """Pick the prefix cache from PROMPT_CACHE: vertex (default), local or off"""
+    mode = os.getenv("PROMPT_CACHE", "vertex").lower()
+    if mode == "local":
+        return LocalContextCache()
+    if mode == "vertex":
+        return VertexContextCache(
+            ttl_seconds=int(os.getenv("PROMPT_CACHE_TTL_SECONDS", 3600)),
+            min_tokens=int(os.getenv("PROMPT_CACHE_MIN_TOKENS", 4096))
+        )
+    return None
+
+INTENT_EXTRACTION = "intent_extraction"
+
+registry = PromptRegistry()
+
+registry.register(PromptTemplate(
+    name=INTENT_EXTRACTION,
+    version="v1",
+    static_prefix="""Extract real estate transaction details from the request below.
+
+    Return a JSON object with these fields:
+    - form_type: Type of document needed (use "purchase_agreement" for purchase requests)
+    - property_address: Full property address
+    - price: Purchase price as number (no formatting, no dollar signs)
+    - built_year: Year property was built
+    - escrow_days: Number of days for escrow
+    - contingencies: Array of contingencies mentioned
+    - confidence: Confidence score 0-1
+
+    Return ONLY the JSON object, no other text.
+    """,
+    input_template='\nRequest: "{user_input}"\n'
+))
+
+registry.register(PromptTemplate(
+    name=INTENT_EXTRACTION,
+    version="v2",
+    static_prefix="""Extract real estate transaction details from the request below.
+
+    You MUST return ONLY a valid JSON object with NO additional text, markdown, or explanation.
+
+    Example format:
+    {
+        "form_type": "purchase_agreement",
+        "property_address": "789 Ocean View Drive",
+        "price": 1200000,
+        "built_year": 1975,
+        "escrow_days": 30,
+        "contingencies": ["inspection", "loan"],
+        "confidence": 0.95
+    }
+
+    Extract only what is explicitly mentioned. Use null for missing values.
+    """,
+    input_template='\nRequest: "{user_input}"\n'
+))
+
+registry.activate(INTENT_EXTRACTION, os.getenv("INTENT_PROMPT_VERSION", "v1"))
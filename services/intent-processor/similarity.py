@@ -0,0 +1,260 @@
+"""Near-duplicate query index for reusing prior intent extractions
+
+Queries are normalized (case, punctuation, money formats such as "$1.2M" and
+"1,200,000"), split into word and word-pair shingles and summarized with a
+MinHash signature. LSH banding finds candidates without scanning every
+entry; candidates are then scored by exact Jaccard similarity of their
+stored shingle sets, since the MinHash estimate alone is too noisy
+(about +/-0.06) near the threshold. A candidate is reused only if that score
+clears the threshold and the two queries agree on everything the extraction depends on:
+the same numbers, the same street addresses, and the same form and
+contingency keywords. The cached result's own address and contingencies must
+also appear in the new text. A changed price, street, form type or
+contingency always goes back to the model.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_MONEY = re.compile(
+    r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m|mm|million|thousand)?\b"
+)
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "mm": 1_000_000, "million": 1_000_000}
+_NON_WORD = re.compile(r"[^a-z0-9.]+")
+
+# Street suffixes, canonicalized so "Dr" and "Drive" compare equal
+_STREET_SUFFIXES = {
+    "st": "street", "street": "street", "ave": "avenue", "av": "avenue", "avenue": "avenue",
+    "dr": "drive", "drive": "drive", "rd": "road", "road": "road", "ln": "lane", "lane": "lane",
+    "blvd": "boulevard", "boulevard": "boulevard", "ct": "court", "court": "court",
+    "way": "way", "pl": "place", "place": "place", "cir": "circle", "circle": "circle",
+    "ter": "terrace", "terrace": "terrace", "pkwy": "parkway", "parkway": "parkway",
+    "hwy": "highway", "highway": "highway", "trl": "trail", "trail": "trail", "loop": "loop",
+    "sq": "square", "square": "square", "real": "real", "row": "row", "alley": "alley",
+}
+_ADDRESS = re.compile(
+    r"\b(\d+) ((?:[a-z]+ ){0,4}?)(" + "|".join(sorted(_STREET_SUFFIXES, key=len, reverse=True)) + r")\b"
+)
+
+# Words that change which form is drafted or what it contains, mapped to a concept
+_KEYWORDS = {
+    **dict.fromkeys(("purchase", "purchasing", "buy", "buying", "sale", "sell", "selling"), "purchase"),
+    **dict.fromkeys(("lease", "leasing", "rent", "rental", "renting", "tenant", "landlord"), "lease"),
+    **dict.fromkeys(("listing", "list"), "listing"),
+    **dict.fromkeys(("counter", "counteroffer"), "counter"),
+    **dict.fromkeys(("addendum", "amendment", "amend"), "addendum"),
+    **dict.fromkeys(("cancel", "cancellation", "terminate", "termination"), "cancel"),
+    **dict.fromkeys(("extension", "extend"), "extension"),
+    **dict.fromkeys(("disclosure", "disclosures"), "disclosure"),
+    **dict.fromkeys(("inspection", "inspections"), "inspection"),
+    **dict.fromkeys(("loan", "financing", "mortgage"), "loan"),
+    **dict.fromkeys(("appraisal",), "appraisal"),
+    **dict.fromkeys(("commercial",), "commercial"),
+    **dict.fromkeys(("no", "without", "waive", "waived", "waiving", "waiver"), "negation"),
+}
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if value == int(value) else f"{value:g}"
+
+def normalize(text: str) -> Tuple[str, Tuple[str, ...]]:
+    """Return (normalized text, sorted numbers it mentions)"""
+    text = text.lower()
+    numbers = []
+
+    def _number(match):
+        digits, suffix = match.group(1).replace(",", ""), match.group(2)
+        try:
+            value = float(digits) * _MULTIPLIERS.get(suffix, 1)
+        except ValueError:
+            return match.group(0)
+        formatted = _format_number(value)
+        numbers.append(formatted)
+        return f" {formatted} "
+
+    text = _MONEY.sub(_number, text)
+    text = _NON_WORD.sub(" ", text)
+    # Drop sentence-ending dots left next to words
+    text = " ".join(token.strip(".") for token in text.split() if token.strip("."))
+    return text, tuple(sorted(numbers))
+
+def _canonical_words(normalized: str) -> List[str]:
+    return [_STREET_SUFFIXES.get(word, word) for word in normalized.split()]
+
+def addresses(normalized: str) -> Tuple[str, ...]:
+    """Street addresses ("789 ocean view drive") mentioned in normalized text"""
+    canonical = " ".join(_canonical_words(normalized))
+    return tuple(sorted(" ".join(m.group(0).split()) for m in _ADDRESS.finditer(canonical)))
+
+def keywords(normalized: str) -> frozenset:
+    return frozenset(_KEYWORDS[word] for word in normalized.split() if word in _KEYWORDS)
+
+def _contains_phrase(words: List[str], phrase: List[str]) -> bool:
+    n = len(phrase)
+    return any(words[i:i + n] == phrase for i in range(len(words) - n + 1))
+
+def shingles(normalized: str) -> set:
+    """Word unigrams and bigrams; unigrams keep reordered clauses similar"""
+    words = normalized.split()
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, tokens: set) -> Tuple[int, ...]:
+        if not tokens:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), "little")
+                  for t in tokens]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 1.0
+
+class _Entry:
+    __slots__ = ("signature", "tokens", "numbers", "fingerprint", "result", "created")
+
+    def __init__(self, signature, tokens, numbers, fingerprint, result, created):
+        self.signature = signature
+        self.tokens = tokens
+        self.numbers = numbers
+        self.fingerprint = fingerprint
+        self.result = result
+        self.created = created
+
+class NearDuplicateIndex:
+    """Bounded LRU of recent queries with MinHash/LSH lookup"""
+
+    def __init__(self, threshold: float = 0.7, max_entries: int = 5000, ttl_seconds: float = 3600,
+                 num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: List[Dict[Tuple[int, ...], set]] = [{} for _ in range(bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected_numbers = 0
+        self.rejected_fields = 0
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for band, key in self._band_keys(entry.signature):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """Return a copy of a reusable prior result, or None"""
+        normalized, numbers = normalize(query)
+        tokens = frozenset(shingles(normalized))
+        signature = self.hasher.signature(tokens)
+        fingerprint = (addresses(normalized), keywords(normalized))
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates |= self._buckets[band].get(key, set())
+
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.created > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                score = jaccard(tokens, entry.tokens)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best_id]
+            if entry.numbers != numbers or not self._numbers_match(entry.result, numbers):
+                self.rejected_numbers += 1
+                self.misses += 1
+                return None
+            if entry.fingerprint != fingerprint or not self._fields_match(entry.result, normalized):
+                self.rejected_fields += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return dict(entry.result)
+
+    @staticmethod
+    def _numbers_match(result: Dict, numbers) -> bool:
+        """Every numeric field in the cached result must appear in the new text"""
+        for field in ("price", "built_year", "escrow_days"):
+            value = result.get(field)
+            if value is not None and _format_number(float(value)) not in numbers:
+                return False
+        return True
+
+    @staticmethod
+    def _fields_match(result: Dict, normalized: str) -> bool:
+        """The cached address and contingencies must be stated in the new text"""
+        words = _canonical_words(normalized)
+        address = result.get("property_address")
+        if address and not _contains_phrase(words, _canonical_words(normalize(address)[0])):
+            return False
+        concepts = keywords(normalized)
+        for contingency in result.get("contingencies") or []:
+            terms = set(normalize(str(contingency))[0].split()) - {"contingency"}
+            if terms and not any(term in words or _KEYWORDS.get(term) in concepts for term in terms):
+                return False
+        return True
+
+    def add(self, query: str, result: Dict):
+        normalized, numbers = normalize(query)
+        tokens = frozenset(shingles(normalized))
+        signature = self.hasher.signature(tokens)
+        fingerprint = (addresses(normalized), keywords(normalized))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(signature, tokens, numbers, fingerprint, dict(result), time.monotonic())
+            for band, key in self._band_keys(signature):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected_on_numbers": self.rejected_numbers,
+                "rejected_on_fields": self.rejected_fields,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -0,0 +1,38 @@
+"""Prefix token counts are taken once at startup, per template version and per model"""
+
+from types import SimpleNamespace
+
+from prompts import PromptRegistry, PromptTemplate
+
+class FakeModel:
+    def __init__(self, chars_per_token):
+        self.chars_per_token = chars_per_token
+        self.calls = 0
+
+    def count_tokens(self, text):
+        self.calls += 1
+        return SimpleNamespace(total_tokens=len(text) // self.chars_per_token)
+
+def _registry():
+    registry = PromptRegistry()
+    registry.register(PromptTemplate("extract", "v1", "x" * 400, "{user_input}"))
+    registry.register(PromptTemplate("extract", "v2", "x" * 800, "{user_input}"), active=True)
+    return registry
+
+def test_counts_every_version_for_every_model():
+    registry = _registry()
+    flash, pro = FakeModel(4), FakeModel(2)
+    registry.count_prefixes([("flash", flash), ("pro", pro)])
+    assert flash.calls == 2 and pro.calls == 2
+
+    v1, v2 = registry.get("extract", "v1"), registry.get("extract")
+    assert registry.prefix_tokens(v1, "flash") == 100
+    assert registry.prefix_tokens(v2, "pro") == 400
+    assert registry.describe()["extract"]["prefix_tokens"] == {
+        "flash/v1": 100, "flash/v2": 200, "pro/v1": 200, "pro/v2": 400
+    }
+
+def test_lookup_never_calls_the_model():
+    registry = _registry()
+    # Not counted at startup (PROMPT_CACHE=off): estimate instead of a blocking call
+    assert registry.prefix_tokens(registry.get("extract"), "flash") == 200
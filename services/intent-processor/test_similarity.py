@@ -0,0 +1,54 @@
+"""Regression tests for near-duplicate reuse: rephrasings may hit, changed facts must miss"""
+
+import pytest
+
+from similarity import NearDuplicateIndex
+
+QUERY = "Create purchase agreement for 789 Ocean View Drive, $1.2M, built 1975, 30-day escrow"
+RESULT = {
+    "form_type": "purchase_agreement",
+    "property_address": "789 Ocean View Drive",
+    "price": 1200000.0,
+    "built_year": 1975,
+    "escrow_days": 30,
+    "contingencies": [],
+    "confidence": 0.95,
+}
+
+@pytest.fixture
+def index():
+    index = NearDuplicateIndex()
+    index.add(QUERY, RESULT)
+    return index
+
+@pytest.mark.parametrize("query", [
+    QUERY,
+    "create purchase agreement for 789 ocean view drive, $1,200,000, built 1975, 30-day escrow",
+    "Create purchase agreement for 789 Ocean View Dr, $1.2M, built 1975, 30-day escrow",
+    # reordered clauses: true Jaccard 0.73, but the 64-permutation MinHash estimate is 0.67
+    "30-day escrow, built 1975, $1.2M, purchase agreement for 789 Ocean View Drive",
+])
+def test_rephrasing_reuses_extraction(index, query):
+    assert index.lookup(query) == RESULT
+
+@pytest.mark.parametrize("query", [
+    # different street name
+    "Create purchase agreement for 789 Sunset View Drive, $1.2M, built 1975, 30-day escrow",
+    # different street suffix
+    "Create purchase agreement for 789 Ocean View Court, $1.2M, built 1975, 30-day escrow",
+    # different form
+    "Create lease agreement for 789 Ocean View Drive, $1.2M, built 1975, 30-day escrow",
+    # added contingency
+    "Create purchase agreement for 789 Ocean View Drive, $1.2M, built 1975, 30-day escrow, inspection",
+    # changed number
+    "Create purchase agreement for 789 Ocean View Drive, $1.3M, built 1975, 30-day escrow",
+])
+def test_changed_facts_go_back_to_the_model(index, query):
+    assert index.lookup(query) is None
+
+def test_cached_contingencies_must_be_stated(index):
+    query = "Purchase agreement for 12 Elm Street, $900k, inspection contingency"
+    index.add(query, {**RESULT, "property_address": "12 Elm Street", "price": 900000.0,
+                      "built_year": None, "escrow_days": None, "contingencies": ["inspection"]})
+    assert index.lookup(query) is not None
+    assert index.lookup("Purchase agreement for 12 Elm Street, $900k, no inspection contingency") is None
@@ -0,0 +1,246 @@
+"""Admission control for orchestrator endpoints
+
+Requests are split into priority classes (interactive, batch), queued in
+earliest-deadline-first order, and admitted against a concurrency limit that
+adapts to observed downstream latency. Requests that cannot start before
+their deadline are shed early with 429 + Retry-After instead of timing out.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional
+
+from flask import jsonify, request
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the Retry-After hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _Waiter:
+    __slots__ = ("priority", "deadline", "event", "admitted")
+
+    def __init__(self, priority: str, deadline: float):
+        self.priority = priority
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.admitted = False
+
+class AdaptiveLimit:
+    """Gradient-style concurrency limit driven by request latency
+
+    Compares the best latency seen recently (no-load baseline) with the
+    smoothed current latency. When latency inflates the limit shrinks
+    proportionally; while latency stays near baseline it grows by a
+    sqrt(limit) allowance. Failures cut the limit multiplicatively.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 tolerance: float = 1.5, smoothing: float = 0.2,
+                 baseline_window: float = 60.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.baseline_window = baseline_window
+        self.min_latency = None
+        self.smoothed_latency = None
+        self._baseline_reset_at = time.monotonic()
+
+    def update(self, latency: float, success: bool, in_flight: int) -> int:
+        now = time.monotonic()
+        if not success:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+            return self.current
+
+        if now - self._baseline_reset_at > self.baseline_window:
+            # Let the baseline drift so a permanently slower backend is not penalised forever
+            self.min_latency = self.smoothed_latency
+            self._baseline_reset_at = now
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency = 0.9 * self.smoothed_latency + 0.1 * latency
+
+        # Only grow when we are actually using the limit we have
+        if in_flight < self.limit / 2:
+            return self.current
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.min_latency / self.smoothed_latency))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = (1 - self.smoothing) * self.limit + self.smoothing * target
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+        return self.current
+
+    @property
+    def current(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+class AdmissionController:
+    """Priority-aware, deadline-aware admission in front of Flask views"""
+
+    def __init__(self, initial_limit: int = 20, min_limit: int = 2, max_limit: int = 200,
+                 max_queue: int = 50, batch_share: float = 0.75,
+                 default_deadlines: Optional[Dict[str, float]] = None):
+        self.limiter = AdaptiveLimit(initial_limit, min_limit, max_limit)
+        self.max_queue = max_queue
+        self.batch_share = batch_share
+        self.default_deadlines = default_deadlines or {INTERACTIVE: 10.0, BATCH: 120.0}
+        self.in_flight = {p: 0 for p in PRIORITIES}
+        self.shed = {p: 0 for p in PRIORITIES}
+        self.admitted = {p: 0 for p in PRIORITIES}
+        self._queues = {p: [] for p in PRIORITIES}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    # -- scheduling -------------------------------------------------------
+
+    def _total_in_flight(self) -> int:
+        return sum(self.in_flight.values())
+
+    def _batch_limit(self) -> int:
+        # Batch never takes the whole limit, so interactive always finds headroom
+        return max(1, int(self.limiter.current * self.batch_share))
+
+    def _can_start(self, priority: str) -> bool:
+        if self._total_in_flight() >= self.limiter.current:
+            return False
+        if priority == BATCH:
+            return not self._queues[INTERACTIVE] and self.in_flight[BATCH] < self._batch_limit()
+        return True
+
+    def _expected_wait(self, priority: str) -> float:
+        latency = self.limiter.smoothed_latency
+        if latency is None:
+            return 0.0  # no samples yet, nothing to predict from
+        ahead = len(self._queues[INTERACTIVE])
+        if priority == BATCH:
+            ahead += len(self._queues[BATCH])
+        return (ahead + 1) / max(1, self.limiter.current) * latency
+
+    def _retry_after(self, priority: str) -> int:
+        return max(1, math.ceil(self._expected_wait(priority)))
+
+    def _dispatch(self):
+        """Hand free slots to queued waiters: interactive first, each class EDF"""
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                _, _, waiter = queue[0]
+                if waiter.event.is_set():
+                    heapq.heappop(queue)
+                    continue
+                if waiter.deadline <= now:
+                    heapq.heappop(queue)
+                    waiter.event.set()  # wakes as not admitted -> shed
+                    continue
+                if not self._can_start(priority):
+                    break
+                heapq.heappop(queue)
+                self._start(waiter)
+
+    def _start(self, waiter: _Waiter):
+        self.in_flight[waiter.priority] += 1
+        self.admitted[waiter.priority] += 1
+        waiter.admitted = True
+        waiter.event.set()
+
+    # -- public API -------------------------------------------------------
+
+    def acquire(self, priority: str, budget: Optional[float] = None) -> _Waiter:
+        """Block until admitted or raise AdmissionRejected"""
+        if priority not in PRIORITIES:
+            priority = INTERACTIVE
+        budget = budget if budget is not None else self.default_deadlines[priority]
+        now = time.monotonic()
+        latency = self.limiter.smoothed_latency or 0.0
+        # Must start early enough to finish within the budget
+        waiter = _Waiter(priority, now + max(0.0, budget - latency))
+
+        with self._lock:
+            if self._can_start(priority) and not self._queues[priority]:
+                self._start(waiter)
+                return waiter
+            if len(self._queues[priority]) >= self.max_queue:
+                self.shed[priority] += 1
+                raise AdmissionRejected("queue full", self._retry_after(priority))
+            if now + self._expected_wait(priority) > waiter.deadline:
+                self.shed[priority] += 1
+                raise AdmissionRejected("deadline cannot be met", self._retry_after(priority))
+            heapq.heappush(self._queues[priority], (waiter.deadline, next(self._counter), waiter))
+
+        waiter.event.wait(timeout=max(0.0, waiter.deadline - time.monotonic()))
+
+        with self._lock:
+            if not waiter.admitted:
+                waiter.event.set()  # lazily removed from the heap by _dispatch
+                self.shed[priority] += 1
+                raise AdmissionRejected("deadline expired in queue", self._retry_after(priority))
+        return waiter
+
+    def release(self, waiter: _Waiter, latency: float, success: bool):
+        with self._lock:
+            self.in_flight[waiter.priority] -= 1
+            self.limiter.update(latency, success, self._total_in_flight() + 1)
+            self._dispatch()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "limit": self.limiter.current,
+                "batch_limit": self._batch_limit(),
+                "smoothed_latency_ms": round((self.limiter.smoothed_latency or 0) * 1000, 1),
+                "in_flight": dict(self.in_flight),
+                "queued": {p: len(q) for p, q in self._queues.items()},
+                "admitted": dict(self.admitted),
+                "shed": dict(self.shed)
+            }
+
+    def admit(self, view):
+        """Flask view decorator
+
+        Priority comes from the X-Priority header (interactive|batch, default
+        interactive); an optional X-Request-Deadline-Ms header sets the time
+        budget, otherwise the per-class default is used.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            priority = request.headers.get("X-Priority", INTERACTIVE).lower()
+            budget = request.headers.get("X-Request-Deadline-Ms")
+            try:
+                budget = float(budget) / 1000 if budget else None
+            except ValueError:
+                budget = None
+
+            try:
+                waiter = self.acquire(priority, budget)
+            except AdmissionRejected as e:
+                response = jsonify({"error": f"Overloaded: {e.reason}", "retry_after": e.retry_after})
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response, 429
+
+            started = time.monotonic()
+            success = False
+            try:
+                result = view(*args, **kwargs)
+                status = result[1] if isinstance(result, tuple) else 200
+                success = status < 500
+                return result
+            finally:
+                self.release(waiter, time.monotonic() - started, success)
+        return wrapper
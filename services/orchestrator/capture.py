@@ -0,0 +1,118 @@
+"""Sanitized traffic capture for load replay (see tools/loadgen.py)
+
+Enabled by setting TRACE_CAPTURE_PATH. Each captured request is one compact
+JSON line: arrival timestamp, method, path, the headers that affect
+scheduling, the sanitized body, and the observed status and latency. Use TRACE_SAMPLE_RATE (0-1) to capture only a fraction.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from flask import g, request
+
+CAPTURED_HEADERS = ("X-Priority", "X-Request-Deadline-Ms")
+
+# Queries are reduced to a template of the same shape: emails and phone numbers
+# become fixed placeholders, words outside a small real-estate vocabulary are
+# masked letter for letter ("Ocean" -> "Xxxxx"), and numbers other than
+# years and small counts keep only their magnitude ("94301" -> "10000"). Names,
+# streets, cities and ZIP codes never reach the trace, while the length, form
+# keywords, price range and build year that drive the pipeline are kept.
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\(?\b\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b")
+_WORD = re.compile(r"[A-Za-z]+")
+_NUMBER = re.compile(r"\d+")
+
+_VOCABULARY = frozenset("""
+    a an the and or but if of to in on at by for from with without no not as is are was be been this that
+    these those it its my our your their i we you he she they me us them please need needs want wants would
+    like can could should will create draft prepare make generate write send start new fill out form forms
+    agreement agreements contract purchase buy buying buyer buyers sale sell selling seller sellers lease
+    leasing rent rental tenant landlord listing list offer counter counteroffer addendum amendment disclosure
+    disclosures cancel cancellation extension escrow day days week weeks month months year years built
+    build home house condo townhouse property properties unit apartment duplex lot land commercial
+    residential single family price priced asking at about around k m mm million thousand dollars usd
+    inspection inspections loan financing mortgage appraisal contingency contingencies contingent waive
+    waived waiver close closing deposit earnest down payment cash all as is pre approved approval
+    lead paint hazard natural earthquake flood fire zone smoke detector water heater pool hoa
+    street st avenue ave drive dr road rd lane ln boulevard blvd way court ct place pl circle cir
+    terrace highway hwy parkway real estate ca california
+""".split())
+
+def _mask_word(match):
+    word = match.group(0)
+    if word.lower() in _VOCABULARY:
+        return word
+    return "".join("X" if ch.isupper() else "x" for ch in word)
+
+def _mask_number(match):
+    digits = match.group(0)
+    value = int(digits)
+    if value <= 365 or 1800 <= value <= 2099:
+        return digits  # counts (escrow days) and build years drive compliance triggers
+    return "1" + "0" * (len(digits) - 1)
+
+def sanitize_text(text: str) -> str:
+    text = _NUMBER.sub(_mask_number, _WORD.sub(_mask_word, text))
+    # Still recognizable after masking; replaced whole so the placeholders read naturally
+    text = _EMAIL.sub("user@example.com", text)
+    return _PHONE.sub("555-555-0100", text)
+
+def sanitize(value):
+    if isinstance(value, str):
+        return sanitize_text(value)
+    if isinstance(value, dict):
+        return {key: sanitize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+class TraceRecorder:
+    """Appends sanitized request records to a JSONL trace file"""
+
+    def __init__(self, path: str, sample_rate: float = 1.0, paths=("/process", "/pipeline")):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.paths = set(paths)
+        self._lock = threading.Lock()
+        # Line-buffered append, so records from several workers interleave whole lines
+        self._file = open(path, "a", buffering=1)
+
+    def _write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def init_app(self, app):
+        @app.before_request
+        def _start_capture():
+            if request.path in self.paths and random.random() < self.sample_rate:
+                g.capture_started = time.time()
+
+        @app.after_request
+        def _finish_capture(response):
+            started = g.pop("capture_started", None)
+            if started is not None:
+                self._write({
+                    "ts": round(started, 4),
+                    "m": request.method,
+                    "p": request.path,
+                    "h": {h: request.headers[h] for h in CAPTURED_HEADERS if h in request.headers},
+                    "b": sanitize(request.get_json(silent=True)),
+                    "s": response.status_code,
+                    "ms": round((time.time() - started) * 1000, 1)
+                })
+            return response
+
+def init_capture(app):
+    """Attach a TraceRecorder if TRACE_CAPTURE_PATH is set"""
+    path = os.environ.get("TRACE_CAPTURE_PATH")
+    if not path:
+        return None
+    recorder = TraceRecorder(path, float(os.environ.get("TRACE_SAMPLE_RATE", 1.0)))
+    recorder.init_app(app)
+    return recorder
@@ -0,0 +1,409 @@
+"""Durable asynchronous jobs for long orchestrator pipelines
+
+POST /jobs stores the request and returns at once; a pool of worker threads
+claims jobs from the store, runs the pipeline and records the result for
+GET /jobs/<id>, optionally POSTing it to a completion webhook.
+
+JobStore is the pluggable interface. SQLiteJobStore is the local stand-in:
+jobs survive restarts, a worker that dies mid-job loses its lease and the
+job is picked up again, failed jobs are retried with backoff, and duplicate
+submissions map to the same job. With an Idempotency-Key that holds for the
+key's lifetime; without one, a submission with the same body and webhook is
+only a duplicate while the earlier job is still running or finished less
+than a short window ago, so a later rerun of the same query runs again.
+"""
+
+import hashlib
+import ipaddress
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class RetryLater(Exception):
+    """Raised by a job handler to put the job back without using up an attempt"""
+
+    def __init__(self, delay: float):
+        super().__init__(f"retry in {delay}s")
+        self.delay = delay
+
+def dedup_key_for(payload: Dict, idempotency_key: Optional[str] = None,
+                  webhook_url: Optional[str] = None) -> str:
+    if idempotency_key:
+        return f"key:{idempotency_key}"
+    # The webhook is part of the body: a different submitter must get its own notification
+    canonical = json.dumps({"payload": payload, "webhook_url": webhook_url},
+                           sort_keys=True, separators=(",", ":"))
+    return "body:" + hashlib.sha256(canonical.encode()).hexdigest()
+
+def check_webhook_url(url: str, allowed_hosts: Iterable[str]):
+    """Raise ValueError unless `url` is an https URL on an allowed, publicly routable host
+
+    allowed_hosts entries are exact host names or ".example.com" for any subdomain.
+    With no allowed hosts, webhooks are disabled. The host is resolved and every
+    address must be global, so internal services and the metadata server cannot be
+    reached even through an allowed name.
+    """
+    allowed = [host.strip().lower() for host in allowed_hosts if host.strip()]
+    if not allowed:
+        raise ValueError("Webhooks are not enabled on this deployment")
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme != "https" or not host or parts.username or parts.password:
+        raise ValueError("webhook_url must be an https URL without credentials")
+    if not any(host == entry or (entry.startswith(".") and host.endswith(entry)) for entry in allowed):
+        raise ValueError(f"webhook host {host} is not allowed")
+    try:
+        infos = socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        raise ValueError(f"webhook host {host} does not resolve")
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0]).is_global:
+            raise ValueError(f"webhook host {host} resolves to a non-public address")
+
+class JobStore:
+    """Interface for job persistence; implement this to back jobs with another queue"""
+
+    def enqueue(self, payload: Dict, dedup_key: str, priority: int = 0,
+                webhook_url: Optional[str] = None, max_attempts: int = 3) -> Tuple[Dict, bool]:
+        """Store a job; returns (job, created) where created is False for a duplicate"""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        """Atomically take the next runnable job, or None"""
+        raise NotImplementedError
+
+    def extend_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Heartbeat; False if the worker no longer holds the job"""
+        raise NotImplementedError
+
+    # complete/fail/release only apply while `worker_id` still holds the job,
+    # and return False otherwise so a worker whose lease lapsed cannot overwrite a newer attempt
+
+    def complete(self, job_id: str, worker_id: str, result: Dict) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_in: Optional[float]) -> bool:
+        """Record a failure; requeue after retry_in seconds, or fail for good if None"""
+        raise NotImplementedError
+
+    def release(self, job_id: str, worker_id: str, delay: float) -> bool:
+        """Put a claimed job back without counting the attempt"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def record_webhook(self, job_id: str, status: str):
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+class SQLiteJobStore(JobStore):
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            dedup_key TEXT UNIQUE NOT NULL,
+            status TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            webhook_url TEXT,
+            webhook_status TEXT,
+            worker_id TEXT,
+            lease_expires_at REAL,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, priority, run_after, created_at);
+    """
+
+    def __init__(self, path: str = "jobs.db", body_dedup_seconds: float = 60.0):
+        self.path = path
+        self.body_dedup_seconds = body_dedup_seconds
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # A connection per call keeps this safe across worker threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, payload, dedup_key, priority=0, webhook_url=None, max_attempts=3):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedup_key.startswith("body:"):
+                # Body matches only dedup against live or just-finished jobs; retire older keys
+                conn.execute(
+                    """UPDATE jobs SET dedup_key = dedup_key || '#' || id
+                       WHERE dedup_key = ? AND status IN (?, ?) AND updated_at < ?""",
+                    (dedup_key, SUCCEEDED, FAILED, now - self.body_dedup_seconds)
+                )
+            cursor = conn.execute(
+                """INSERT OR IGNORE INTO jobs
+                   (id, dedup_key, status, priority, payload, attempts, max_attempts,
+                    webhook_url, run_after, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?)""",
+                (job_id, dedup_key, QUEUED, priority, json.dumps(payload), max_attempts,
+                 webhook_url, now, now, now)
+            )
+            created = cursor.rowcount == 1
+            if not created:
+                # Resubmitting a job that failed for good starts it over
+                conn.execute(
+                    """UPDATE jobs SET status = ?, attempts = 0, error = NULL, run_after = ?,
+                       updated_at = ? WHERE dedup_key = ? AND status = ?""",
+                    (QUEUED, now, now, dedup_key, FAILED)
+                )
+            row = conn.execute("SELECT * FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()
+            conn.execute("COMMIT")
+        return self._to_dict(row), created
+
+    def claim(self, worker_id, lease_seconds):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A job whose worker keeps dying mid-run must not be retried forever
+                conn.execute(
+                    """UPDATE jobs SET status = ?, error = 'worker lease expired', updated_at = ?
+                       WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts""",
+                    (FAILED, now, RUNNING, now)
+                )
+                # Queued jobs that are due, plus running jobs whose worker lost its lease
+                row = conn.execute(
+                    """SELECT id FROM jobs
+                       WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_expires_at < ?)
+                       ORDER BY priority, run_after, created_at LIMIT 1""",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    """UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1,
+                       lease_expires_at = ?, updated_at = ? WHERE id = ?""",
+                    (RUNNING, worker_id, now + lease_seconds, now, row["id"])
+                )
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(job)
+
+    def _update(self, job_id, worker_id=None, **fields) -> bool:
+        """Apply `fields`; with worker_id, only while that worker still holds the running job"""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        where, params = "id = ?", [job_id]
+        if worker_id is not None:
+            where += " AND worker_id = ? AND status = ?"
+            params += [worker_id, RUNNING]
+        with self._connect() as conn:
+            cursor = conn.execute(f"UPDATE jobs SET {assignments} WHERE {where}", (*fields.values(), *params))
+        return cursor.rowcount == 1
+
+    def extend_lease(self, job_id, worker_id, lease_seconds):
+        return self._update(job_id, worker_id, lease_expires_at=time.time() + lease_seconds)
+
+    def complete(self, job_id, worker_id, result):
+        return self._update(job_id, worker_id, status=SUCCEEDED, result=json.dumps(result), error=None,
+                            lease_expires_at=None)
+
+    def fail(self, job_id, worker_id, error, retry_in):
+        if retry_in is None:
+            return self._update(job_id, worker_id, status=FAILED, error=error, lease_expires_at=None)
+        return self._update(job_id, worker_id, status=QUEUED, error=error, lease_expires_at=None,
+                            run_after=time.time() + retry_in)
+
+    def release(self, job_id, worker_id, delay):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """UPDATE jobs SET status = ?, attempts = attempts - 1, lease_expires_at = NULL,
+                   run_after = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?""",
+                (QUEUED, time.time() + delay, time.time(), job_id, worker_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def record_webhook(self, job_id, status):
+        self._update(job_id, webhook_status=status)
+
+    def counts(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+def public_view(job: Dict) -> Dict:
+    """The parts of a job returned by GET /jobs/<id>"""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "result": job["result"],
+        "error": job["error"] if job["status"] != SUCCEEDED else None,
+        "webhook_status": job["webhook_status"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+class JobWorkerPool:
+    """Threads that claim jobs from a JobStore and run them through `handler`"""
+
+    def __init__(self, store: JobStore, handler: Callable[[Dict], Dict], workers: int = 4,
+                 lease_seconds: float = 120.0, poll_interval: float = 0.5,
+                 backoff_base: float = 2.0, webhook_timeout: float = 10.0,
+                 webhook_allowed_hosts: Iterable[str] = ()):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.webhook_timeout = webhook_timeout
+        self.webhook_allowed_hosts = list(webhook_allowed_hosts)
+        self._stop = threading.Event()
+        self._threads = []
+        # job_id -> worker_id for jobs in progress, kept alive by the heartbeat thread
+        self._active: Dict[str, str] = {}
+        self._active_lock = threading.Lock()
+
+    def start(self):
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(f"{uuid.uuid4().hex[:8]}-{n}",),
+                                      name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info("Started %s job workers", self.workers)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _loop(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error("Job claim failed: %s", e)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            with self._active_lock:
+                self._active[job["id"]] = worker_id
+            try:
+                self._run(job, worker_id)
+            except Exception:
+                # e.g. the store stayed locked past its timeout; the lease expiry hands the job on
+                logger.exception("Worker %s failed while handling job %s", worker_id, job["id"])
+            finally:
+                with self._active_lock:
+                    self._active.pop(job["id"], None)
+
+    def _heartbeat(self):
+        """Extend the lease of every running job well before it can expire"""
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._active_lock:
+                active = list(self._active.items())
+            for job_id, worker_id in active:
+                try:
+                    if not self.store.extend_lease(job_id, worker_id, self.lease_seconds):
+                        logger.warning("Job %s is no longer held by worker %s", job_id, worker_id)
+                except Exception as e:
+                    logger.error("Lease extension for job %s failed: %s", job_id, e)
+
+    def _run(self, job: Dict, worker_id: str):
+        try:
+            result = self.handler(job["payload"])
+        except RetryLater as e:
+            self.store.release(job["id"], worker_id, e.delay)
+            return
+        except Exception as e:
+            if job["attempts"] < job["max_attempts"]:
+                delay = self.backoff_base ** job["attempts"]
+                logger.warning("Job %s attempt %s failed, retrying in %ss: %s",
+                               job["id"], job["attempts"], delay, e)
+                self.store.fail(job["id"], worker_id, str(e), delay)
+            else:
+                logger.error("Job %s failed after %s attempts: %s", job["id"], job["attempts"], e)
+                if self.store.fail(job["id"], worker_id, str(e), None):
+                    self._notify(job["id"], job.get("webhook_url"))
+            return
+
+        if self.store.complete(job["id"], worker_id, result):
+            self._notify(job["id"], job.get("webhook_url"))
+        else:
+            logger.warning("Job %s finished after worker %s lost its lease; result discarded",
+                           job["id"], worker_id)
+
+    def _notify(self, job_id: str, webhook_url: Optional[str]):
+        if not webhook_url:
+            return
+        try:
+            # Checked again at send time: the allowlist may have changed, or the name may now resolve elsewhere
+            check_webhook_url(webhook_url, self.webhook_allowed_hosts)
+        except ValueError as e:
+            logger.warning("Webhook for job %s refused: %s", job_id, e)
+            self.store.record_webhook(job_id, "refused")
+            return
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        body = public_view(job)
+        for attempt in range(3):
+            try:
+                response = requests.post(webhook_url, json=body, timeout=self.webhook_timeout,
+                                         allow_redirects=False)
+                if response.status_code < 500:
+                    self.store.record_webhook(job_id, f"delivered ({response.status_code})")
+                    return
+            except requests.exceptions.RequestException as e:
+                logger.warning("Webhook for job %s failed: %s", job_id, e)
+            time.sleep(self.backoff_base ** attempt)
+        self.store.record_webhook(job_id, "failed")
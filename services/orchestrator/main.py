@@ -3,14 +3,27 @@ import json
 import requests
 from flask import Flask, request, jsonify
 import logging
+import time
 from typing import Dict, Any
+from admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+from capture import init_capture
+from jobs import JobWorkerPool, RetryLater, SQLiteJobStore, check_webhook_url, dedup_key_for, public_view
+from shared.profiling import register_flask
+from shared.structured_logging import configure_logging, logging_stats, payload, trace_headers, track_trace_flask
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Structured JSON logs, written off the request thread
+configure_logging("orchestrator")
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# On-demand profiling endpoints, enabled by DEBUG_TOKEN
+register_flask(app)
+track_trace_flask(app)
+
+# Optional sanitized traffic capture for tools/loadgen.py (TRACE_CAPTURE_PATH)
+init_capture(app)
+
 # Service URLs - will be set from environment or defaults
 INTENT_PROCESSOR_URL = os.environ.get('INTENT_PROCESSOR_URL', 
     'https://intent-processor-209579160014.us-central1.run.app')
@@ -19,6 +32,23 @@ DOCUMENT_EXTRACTOR_URL = os.environ.get('DOCUMENT_EXTRACTOR_URL',
 COMPLIANCE_VALIDATOR_URL = os.environ.get('COMPLIANCE_VALIDATOR_URL', 
     'https://compliance-validator-209579160014.us-central1.run.app')
 
+# Admission control for /process and /pipeline
+admission = AdmissionController(
+    initial_limit=int(os.environ.get('ADMISSION_INITIAL_LIMIT', 20)),
+    max_limit=int(os.environ.get('ADMISSION_MAX_LIMIT', 200)),
+    max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 50)),
+    batch_share=float(os.environ.get('ADMISSION_BATCH_SHARE', 0.75))
+)
+
+# Durable job mode: POST /jobs returns immediately, workers run the pipeline
+job_store = SQLiteJobStore(
+    os.environ.get('JOB_DB_PATH', 'jobs.db'),
+    body_dedup_seconds=float(os.environ.get('JOB_DEDUP_WINDOW_SECONDS', 60))
+)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Comma-separated hosts ("hooks.example.com", ".example.com") that job webhooks may target; empty disables them
+JOB_WEBHOOK_ALLOWED_HOSTS = os.environ.get('JOB_WEBHOOK_ALLOWED_HOSTS', '').split(',')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -28,94 +58,195 @@ def health_check():
             "intent_processor": INTENT_PROCESSOR_URL,
             "document_extractor": DOCUMENT_EXTRACTOR_URL,
             "compliance_validator": COMPLIANCE_VALIDATOR_URL
-        }
+        },
+        "admission": admission.stats(),
+        "jobs": job_store.counts(),
+        "logging": logging_stats()
     }), 200
 
 @app.route('/process', methods=['POST'])
+@admission.admit
 def process_request():
     """Main orchestration endpoint"""
+    return run_pipeline()
+
+def run_pipeline():
+    """Run intent -> extraction -> compliance for the current request"""
     try:
         data = request.get_json()
         query = data.get('query', '')
         
-        logger.info(f"Processing query: {query}")
-        
-        # Step 1: Process intent
-        intent_response = requests.post(
-            f"{INTENT_PROCESSOR_URL}/process",
-            json={"user_input": query},
-            timeout=10
-        )
-        intent_data = intent_response.json()
-        logger.info(f"Intent processed: {intent_data}")
-        
-        # Step 2: Extract document data (if needed)
-        extraction_data = None
-        if intent_data.get('success'):
-            extraction_response = requests.post(
-                f"{DOCUMENT_EXTRACTOR_URL}/extract_from_intent",
-                json={"intent_data": intent_data},
-                timeout=10
-            )
-            extraction_data = extraction_response.json()
-            logger.info(f"Extraction completed: {extraction_data}")
+        response, timings = execute_pipeline(query)
         
-        # Step 3: Validate compliance
-        compliance_response = requests.post(
-            f"{COMPLIANCE_VALIDATOR_URL}/validate",
-            json={
-                "property_details": {
-                    "built_year": intent_data.get('built_year'),
-                    "price": intent_data.get('price'),
-                    "address": intent_data.get('property_address')
-                },
-                "transaction_type": "purchase"
-            },
-            timeout=10
+        http_response = jsonify(response)
+        http_response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()
         )
-        compliance_data = compliance_response.json()
-        logger.info(f"Compliance validated: {compliance_data}")
-        
-        # Build final response
-        response = {
-            "success": True,
-            "query": query,
-            "intent": intent_data,
-            "extraction": extraction_data,
-            "compliance": compliance_data,
-            "summary": {
-                "property_address": intent_data.get('property_address'),
-                "price": intent_data.get('price'),
-                "built_year": intent_data.get('built_year'),
-                "requires_lead_paint": intent_data.get('built_year', 2000) < 1978,
-                "required_forms": compliance_data.get('required_forms', []),
-                "recommendations": compliance_data.get('recommendations', [])
-            }
-        }
-        
-        return jsonify(response), 200
+        return http_response, 200
         
     except requests.exceptions.RequestException as e:
-        logger.error(f"Service communication error: {str(e)}")
+        logger.error("Service communication error: %s", e)
         return jsonify({"error": f"Service error: {str(e)}"}), 503
     except Exception as e:
-        logger.error(f"Orchestration error: {str(e)}")
+        logger.error("Orchestration error: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def execute_pipeline(query: str):
+    """Call each service in turn; returns (response body, per-service timings)"""
+    logger.info("Processing query: %s", payload(query))
+    
+    # Per-service timings, reported as a Server-Timing header
+    timings = {}
+    
+    # Step 1: Process intent
+    started = time.monotonic()
+    intent_response = requests.post(
+        f"{INTENT_PROCESSOR_URL}/process",
+        json={"user_input": query},
+        headers=trace_headers(),
+        timeout=10
+    )
+    intent_data = intent_response.json()
+    timings["intent"] = time.monotonic() - started
+    logger.info("Intent processed: %s", payload(intent_data))
+    
+    # Step 2: Extract document data (if needed)
+    extraction_data = None
+    if intent_data.get('success'):
+        started = time.monotonic()
+        extraction_response = requests.post(
+            f"{DOCUMENT_EXTRACTOR_URL}/extract_from_intent",
+            json={"intent_data": intent_data},
+            headers=trace_headers(),
+            timeout=10
+        )
+        extraction_data = extraction_response.json()
+        timings["extraction"] = time.monotonic() - started
+        logger.info("Extraction completed: %s", payload(extraction_data))
+    
+    # Step 3: Validate compliance
+    started = time.monotonic()
+    compliance_response = requests.post(
+        f"{COMPLIANCE_VALIDATOR_URL}/validate",
+        json={
+            "property_details": {
+                "built_year": intent_data.get('built_year'),
+                "price": intent_data.get('price'),
+                "address": intent_data.get('property_address')
+            },
+            "transaction_type": "purchase"
+        },
+        headers=trace_headers(),
+        timeout=10
+    )
+    compliance_data = compliance_response.json()
+    timings["compliance"] = time.monotonic() - started
+    logger.info("Compliance validated: %s", payload(compliance_data))
+    
+    # Build final response
+    response = {
+        "success": True,
+        "query": query,
+        "intent": intent_data,
+        "extraction": extraction_data,
+        "compliance": compliance_data,
+        "summary": {
+            "property_address": intent_data.get('property_address'),
+            "price": intent_data.get('price'),
+            "built_year": intent_data.get('built_year'),
+            "requires_lead_paint": intent_data.get('built_year', 2000) < 1978,
+            "required_forms": compliance_data.get('required_forms', []),
+            "recommendations": compliance_data.get('recommendations', [])
+        }
+    }
+    
+    return response, timings
+
 @app.route('/pipeline', methods=['POST'])
+@admission.admit
 def pipeline():
     """Simplified pipeline endpoint"""
     try:
         data = request.get_json()
         query = data.get('query', '')
         
-        # Call main process endpoint
-        return process_request()
+        # Run the main pipeline (already admitted above)
+        return run_pipeline()
+        
+    except Exception as e:
+        logger.error("Pipeline error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a pipeline run and return its job ID without waiting for it"""
+    try:
+        data = request.get_json() or {}
+        query = data.get('query')
+        if not query:
+            return jsonify({"error": "No query provided"}), 400
+        
+        priority = request.headers.get("X-Priority", BATCH).lower()
+        job_payload = {"query": query, "priority": priority}
+        webhook_url = data.get('webhook_url')
+        if webhook_url:
+            try:
+                check_webhook_url(webhook_url, JOB_WEBHOOK_ALLOWED_HOSTS)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        job, created = job_store.enqueue(
+            job_payload,
+            dedup_key_for(job_payload, request.headers.get("Idempotency-Key"), webhook_url),
+            priority=0 if priority == INTERACTIVE else 1,
+            webhook_url=webhook_url,
+            max_attempts=JOB_MAX_ATTEMPTS
+        )
+        
+        return jsonify({
+            "job_id": job["id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['id']}",
+            "deduplicated": not created
+        }), 202
         
     except Exception as e:
-        logger.error(f"Pipeline error: {str(e)}")
+        logger.error("Job submission error: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(public_view(job)), 200
+
+def run_job(job_payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler: run the pipeline under the same admission control as HTTP traffic"""
+    try:
+        waiter = admission.acquire(job_payload.get("priority", BATCH))
+    except AdmissionRejected as e:
+        raise RetryLater(e.retry_after)
+    
+    started = time.monotonic()
+    success = False
+    try:
+        response, _ = execute_pipeline(job_payload["query"])
+        success = True
+        return response
+    finally:
+        admission.release(waiter, time.monotonic() - started, success)
+
+job_workers = JobWorkerPool(
+    job_store,
+    run_job,
+    workers=int(os.environ.get('JOB_WORKERS', 4)),
+    # Renewed by a heartbeat while a job runs; the default still outlasts the 120s batch
+    # admission wait plus three 10s service calls, so a single missed beat cannot cause a rerun
+    lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', 300)),
+    webhook_allowed_hosts=JOB_WEBHOOK_ALLOWED_HOSTS
+)
+if job_workers.workers > 0:
+    job_workers.start()
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
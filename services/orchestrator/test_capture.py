@@ -0,0 +1,40 @@
+"""Trace sanitization must never let addresses, names or contact details through"""
+
+import pytest
+
+from capture import sanitize, sanitize_text
+
+@pytest.mark.parametrize("text, secrets", [
+    ("Create purchase agreement for 789 ocean view drive, $1.2M, built 1975",
+     ["789", "ocean", "view"]),
+    ("Purchase agreement for 1450 El Camino Real, Palo Alto CA 94301",
+     ["1450", "Camino", "Palo", "Alto", "94301"]),
+    ("Offer on 91234 Pacific Coast Hwy, Malibu CA 90265-1234",
+     ["91234", "Pacific", "Coast", "Malibu", "90265"]),
+    ("Lease for 12 MAIN ST APT 4B, SAN JOSE 95112",
+     ["MAIN", "SAN", "JOSE", "95112", "4B"]),
+    ("Email jane.doe@gmail.com or call (415) 555-1234 about the listing",
+     ["jane", "doe", "gmail", "415", "1234"]),
+    ("Buyer Priya Raman, phone 650.555.9876, wants a counteroffer",
+     ["Priya", "Raman", "650", "9876"]),
+])
+def test_sanitize_removes_identifying_text(text, secrets):
+    sanitized = sanitize_text(text)
+    for secret in secrets:
+        assert secret.lower() not in sanitized.lower(), (secret, sanitized)
+
+def test_sanitize_keeps_pipeline_shape():
+    sanitized = sanitize_text("Create purchase agreement for 789 Ocean View Drive, $1.2M, built 1975, 30-day escrow")
+    assert sanitized == "Create purchase agreement for 100 Xxxxx Xxxx Drive, $1.2M, built 1975, 30-day escrow"
+
+def test_contact_details_become_placeholders():
+    sanitized = sanitize_text("jane.doe@gmail.com (415) 555-1234")
+    assert sanitized == "user@example.com 555-555-0100"
+
+def test_sanitize_walks_nested_bodies():
+    body = {"query": "Offer on 789 Ocean View Drive", "context": [{"note": "call 415-555-1234"}], "n": 3}
+    assert sanitize(body) == {
+        "query": "Offer on 100 Xxxxx Xxxx Drive",
+        "context": [{"note": "xxxx 555-555-0100"}],
+        "n": 3
+    }
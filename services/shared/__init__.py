@@ -0,0 +1 @@
+"""Modules shared by every service; copied into each build context at deploy time"""
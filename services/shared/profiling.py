@@ -0,0 +1,277 @@
+"""On-demand CPU profiling and memory snapshots for the RealeAgent services
+
+Endpoints are disabled unless DEBUG_TOKEN is set, and every call must send
+the same value in the X-Debug-Token header.
+
+    GET /debug/profile?seconds=10&interval_ms=5
+        Sample every thread's stack for N seconds and return collapsed stacks
+        ("frame;frame;frame count" lines), the input format of flamegraph.pl,
+        speedscope and inferno.
+    GET /debug/memory?limit=25[&start=1|&stop=1]
+        tracemalloc top allocators (once tracing is on) plus live object
+        counts by type. Set TRACEMALLOC=1 to trace from startup.
+    X-Debug-Profile: 1  (request header)
+        Sample the thread serving that request; the response carries an
+        X-Profile-Id header and the stacks are kept for
+        GET /debug/profile/<id>.
+
+Only the standard library is used, so the module can be dropped into any
+service. Wire it up with register_flask(app) or register_fastapi(app).
+"""
+
+import gc
+import hmac
+import math
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+MAX_PROFILE_SECONDS = 60
+DEFAULT_INTERVAL = 0.005
+KEPT_REQUEST_PROFILES = 20
+TRACEMALLOC_FRAMES = int(os.environ.get("TRACEMALLOC_FRAMES", 10))
+
+if os.environ.get("TRACEMALLOC") == "1":
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+def authorized(token: Optional[str]) -> bool:
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(token or "", DEBUG_TOKEN)
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+class StackSampler:
+    """Periodically records the Python stacks of some or all threads"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample_once(self, skip: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip or (self.thread_id is not None and ident != self.thread_id):
+                continue
+            self.samples[f"{names.get(ident, ident)};{_fold(frame)}"] += 1
+
+    def run(self, seconds: float) -> Counter:
+        """Sample in the calling thread for `seconds` (the caller itself is excluded)"""
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stop.is_set():
+            self._sample_once(me)
+            time.sleep(self.interval)
+        return self.samples
+
+    def start(self):
+        """Sample in a background thread until stop()"""
+        self._thread = threading.Thread(target=self.run, args=(MAX_PROFILE_SECONDS,),
+                                        name="debug-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+def collapsed(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+_profile_lock = threading.Lock()
+_request_profiles: "OrderedDict[str, str]" = OrderedDict()
+_request_profiles_lock = threading.Lock()
+
+def profile(seconds: float, interval: float) -> Optional[str]:
+    """Whole-process profile; None if another profile is already running"""
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    interval = max(0.001, min(float(interval), seconds))
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return collapsed(StackSampler(interval).run(seconds))
+    finally:
+        _profile_lock.release()
+
+def start_request_profile() -> StackSampler:
+    sampler = StackSampler(thread_id=threading.get_ident())
+    sampler.start()
+    return sampler
+
+def finish_request_profile(sampler: StackSampler) -> str:
+    profile_id = uuid.uuid4().hex[:12]
+    output = collapsed(sampler.stop())
+    with _request_profiles_lock:
+        _request_profiles[profile_id] = output
+        while len(_request_profiles) > KEPT_REQUEST_PROFILES:
+            _request_profiles.popitem(last=False)
+    return profile_id
+
+def request_profile(profile_id: str) -> Optional[str]:
+    with _request_profiles_lock:
+        return _request_profiles.get(profile_id)
+
+def memory_snapshot(limit: int = 25, start: bool = False, stop: bool = False) -> Dict:
+    if start and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if stop and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    snapshot = {
+        "tracing": tracemalloc.is_tracing(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "gc_counts": gc.get_count(),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )).statistics("lineno")
+        snapshot["traced_memory_kb"] = {"current": current // 1024, "peak": peak // 1024}
+        snapshot["top_allocators"] = [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count
+            }
+            for stat in stats[:limit]
+        ]
+
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    snapshot["object_counts"] = [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+    return snapshot
+
+def register_flask(app):
+    """Add /debug/profile, /debug/profile/<id>, /debug/memory and the X-Debug-Profile toggle"""
+    from flask import Response, g, jsonify, request
+
+    def _denied():
+        return jsonify({"error": "Not found"}), 404
+
+    def _number(name, default, cast=float):
+        # Raises ValueError naming the bad parameter, for a 400 instead of a 500
+        value = request.args.get(name)
+        if value is None:
+            return default
+        try:
+            number = cast(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number") from None
+        if not math.isfinite(number):
+            raise ValueError(f"{name} must be a number")
+        return number
+
+    @app.route('/debug/profile', methods=['GET'])
+    def debug_profile():
+        if not authorized(request.headers.get("X-Debug-Token")):
+            return _denied()
+        try:
+            seconds = _number("seconds", 10)
+            interval_ms = _number("interval_ms", DEFAULT_INTERVAL * 1000)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        output = profile(seconds, interval_ms / 1000)
+        if output is None:
+            return jsonify({"error": "A profile is already running"}), 409
+        return Response(output, mimetype="text/plain")
+
+    @app.route('/debug/profile/<profile_id>', methods=['GET'])
+    def debug_request_profile(profile_id):
+        if not authorized(request.headers.get("X-Debug-Token")):
+            return _denied()
+        output = request_profile(profile_id)
+        if output is None:
+            return jsonify({"error": "Unknown profile id"}), 404
+        return Response(output, mimetype="text/plain")
+
+    @app.route('/debug/memory', methods=['GET'])
+    def debug_memory():
+        if not authorized(request.headers.get("X-Debug-Token")):
+            return _denied()
+        try:
+            limit = _number("limit", 25, int)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(memory_snapshot(
+            limit,
+            start=request.args.get("start") == "1",
+            stop=request.args.get("stop") == "1"
+        )), 200
+
+    @app.before_request
+    def _start_request_profile():
+        if request.headers.get("X-Debug-Profile") == "1" and authorized(request.headers.get("X-Debug-Token")):
+            g.debug_sampler = start_request_profile()
+
+    @app.after_request
+    def _finish_request_profile(response):
+        sampler = g.pop("debug_sampler", None)
+        if sampler is not None:
+            response.headers["X-Profile-Id"] = finish_request_profile(sampler)
+        return response
+
+def register_fastapi(app):
+    """FastAPI version of register_flask
+
+    Async handlers all run on the event loop thread, so a per-request profile
+    also contains whatever else the loop ran while that request was in flight.
+    """
+    import asyncio
+    from fastapi import Header, HTTPException, Request
+    from fastapi.responses import PlainTextResponse
+
+    def _check(token):
+        if not authorized(token):
+            raise HTTPException(status_code=404, detail="Not found")
+
+    @app.get("/debug/profile", response_class=PlainTextResponse)
+    async def debug_profile(seconds: float = 10, interval_ms: float = DEFAULT_INTERVAL * 1000,
+                            x_debug_token: Optional[str] = Header(None)):
+        _check(x_debug_token)
+        # Sample from a worker thread so the event loop keeps serving (and shows up in the profile)
+        output = await asyncio.to_thread(profile, seconds, interval_ms / 1000)
+        if output is None:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        return output
+
+    @app.get("/debug/profile/{profile_id}", response_class=PlainTextResponse)
+    async def debug_request_profile(profile_id: str, x_debug_token: Optional[str] = Header(None)):
+        _check(x_debug_token)
+        output = request_profile(profile_id)
+        if output is None:
+            raise HTTPException(status_code=404, detail="Unknown profile id")
+        return output
+
+    @app.get("/debug/memory")
+    async def debug_memory(limit: int = 25, start: bool = False, stop: bool = False,
+                           x_debug_token: Optional[str] = Header(None)):
+        _check(x_debug_token)
+        return await asyncio.to_thread(memory_snapshot, limit, start, stop)
+
+    @app.middleware("http")
+    async def request_profile_toggle(request: Request, call_next):
+        if request.headers.get("X-Debug-Profile") != "1" or not authorized(request.headers.get("X-Debug-Token")):
+            return await call_next(request)
+        sampler = start_request_profile()
+        response = await call_next(request)
+        response.headers["X-Profile-Id"] = finish_request_profile(sampler)
+        return response
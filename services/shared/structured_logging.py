@@ -0,0 +1,238 @@
+"""Non-blocking structured logging for the RealeAgent services
+
+configure_logging() replaces logging.basicConfig. Records are put on a
+bounded in-memory queue by the request thread and formatted and written to
+stdout by a single background listener thread, so a slow log sink never
+stalls a request. When the queue is full, records are dropped and counted
+instead of blocking.
+
+Each record is written as one JSON line with the fields Cloud Logging reads
+("severity", "message") plus the request's trace ID, taken from the
+X-Cloud-Trace-Context or traceparent header by track_trace_flask(app) /
+track_trace_fastapi(app). Set LOG_FORMAT=text for plain lines locally.
+
+Large objects should be logged through payload():
+
+    logger.info("Intent processed: %s", payload(intent_data))
+
+Formatting stays lazy, because %s args are only rendered on the listener
+thread and only if the level is enabled. Only LOG_PAYLOAD_SAMPLE_RATE of
+requests log the payload itself, and it is cut to LOG_PAYLOAD_MAX_CHARS.
+The sampling decision follows the trace ID, so a sampled request logs all of
+its payloads. Unsampled requests log a short summary instead. Objects passed
+to payload() are serialized later, so do not mutate them after logging.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", 500))
+PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT", os.environ.get("PROJECT_ID", ""))
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+def parse_trace_header(cloud_trace: Optional[str], traceparent: Optional[str] = None) -> Optional[str]:
+    """Trace ID from "TRACE_ID/SPAN_ID;o=1" or W3C "00-TRACE_ID-SPAN_ID-01" """
+    if cloud_trace:
+        trace_id = cloud_trace.split("/", 1)[0].strip()
+        if trace_id:
+            return trace_id
+    if traceparent:
+        parts = traceparent.split("-")
+        if len(parts) >= 4 and len(parts[1]) == 32:
+            return parts[1]
+    return None
+
+def set_trace_id(trace_id: Optional[str]) -> contextvars.Token:
+    return _trace_id.set(trace_id)
+
+def reset_trace_id(token: contextvars.Token):
+    _trace_id.reset(token)
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+def trace_headers() -> Dict[str, str]:
+    """Headers that carry the current trace to a downstream service"""
+    trace_id = _trace_id.get()
+    return {"X-Cloud-Trace-Context": trace_id} if trace_id else {}
+
+def payload_sampled() -> bool:
+    if PAYLOAD_SAMPLE_RATE >= 1:
+        return True
+    if PAYLOAD_SAMPLE_RATE <= 0:
+        return False
+    trace_id = _trace_id.get()
+    if trace_id:
+        return zlib.crc32(trace_id.encode()) / 0xFFFFFFFF < PAYLOAD_SAMPLE_RATE
+    return random.random() < PAYLOAD_SAMPLE_RATE
+
+class Payload:
+    """Log argument that serializes and truncates only when the record is written"""
+    __slots__ = ("value", "sampled", "max_chars")
+
+    def __init__(self, value: Any, sampled: bool, max_chars: int):
+        self.value = value
+        self.sampled = sampled
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        if not self.sampled:
+            return _summary(self.value)
+        if isinstance(self.value, (str, bytes)):
+            text = self.value.decode(errors="replace") if isinstance(self.value, bytes) else self.value
+        else:
+            text = json.dumps(self.value, default=str, separators=(",", ":"))
+        if len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... [{len(text)} chars]"
+        return text
+
+def _summary(value: Any) -> str:
+    if isinstance(value, dict):
+        return f"<dict, {len(value)} keys, not sampled>"
+    if isinstance(value, (list, tuple, str, bytes)):
+        return f"<{type(value).__name__}, {len(value)} long, not sampled>"
+    return f"<{type(value).__name__}, not sampled>"
+
+def payload(value: Any, max_chars: Optional[int] = None, always: bool = False) -> Payload:
+    """Wrap `value` for logging; always=True skips sampling (e.g. on error paths)"""
+    return Payload(value, always or payload_sampled(), max_chars or PAYLOAD_MAX_CHARS)
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "message": record.getMessage(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                    + f".{int(record.msecs):03d}Z",
+            "logger": record.name,
+            "service": self.service,
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            if PROJECT_ID:
+                entry["logging.googleapis.com/trace"] = f"projects/{PROJECT_ID}/traces/{trace_id}"
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text or record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _TraceFilter(logging.Filter):
+    """Stamps the trace ID on the record while still on the logging thread"""
+
+    def filter(self, record):
+        record.trace_id = _trace_id.get()
+        return True
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare, leave msg/args unformatted for the listener thread
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_NonBlockingQueueHandler] = None
+
+def configure_logging(service: str) -> logging.Logger:
+    """Route all logging through the background queue; safe to call more than once"""
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if _listener is not None:
+        return logging.getLogger(service)
+
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter(service))
+    else:
+        output.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    _queue_handler = _NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(_TraceFilter())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued on shutdown
+    atexit.register(_listener.stop)
+    return logging.getLogger(service)
+
+def logging_stats() -> Dict:
+    if _queue_handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "payload_sample_rate": PAYLOAD_SAMPLE_RATE,
+        "payload_max_chars": PAYLOAD_MAX_CHARS
+    }
+
+def track_trace_flask(app):
+    """Make each request's trace ID available to log records and trace_headers()"""
+    from flask import g, request
+
+    @app.before_request
+    def _set_trace():
+        trace_id = parse_trace_header(request.headers.get("X-Cloud-Trace-Context"),
+                                      request.headers.get("traceparent"))
+        g.trace_token = set_trace_id(trace_id)
+
+    @app.teardown_request
+    def _reset_trace(exc):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            reset_trace_id(token)
+
+def track_trace_fastapi(app):
+    """FastAPI version of track_trace_flask"""
+    from fastapi import Request
+
+    @app.middleware("http")
+    async def trace_context(request: Request, call_next):
+        token = set_trace_id(parse_trace_header(request.headers.get("X-Cloud-Trace-Context"),
+                                                request.headers.get("traceparent")))
+        try:
+            return await call_next(request)
+        finally:
+            reset_trace_id(token)
@@ -0,0 +1,33 @@
+"""Debug endpoints must reject bad parameters with a 400, not a traceback"""
+
+import pytest
+from flask import Flask
+
+import profiling
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "DEBUG_TOKEN", "secret")
+    app = Flask(__name__)
+    profiling.register_flask(app)
+    return app.test_client()
+
+@pytest.mark.parametrize("url", [
+    "/debug/profile?seconds=abc",
+    "/debug/profile?interval_ms=fast",
+    "/debug/profile?seconds=inf",
+    "/debug/memory?limit=ten",
+    "/debug/memory?limit=2.5",
+])
+def test_bad_parameters_are_rejected(client, url):
+    response = client.get(url, headers={"X-Debug-Token": "secret"})
+    assert response.status_code == 400
+    assert "must be a number" in response.get_json()["error"]
+
+def test_valid_parameters_still_work(client):
+    response = client.get("/debug/profile?seconds=0.1&interval_ms=10", headers={"X-Debug-Token": "secret"})
+    assert response.status_code == 200
+    assert client.get("/debug/memory?limit=3", headers={"X-Debug-Token": "secret"}).status_code == 200
+
+def test_requires_token(client):
+    assert client.get("/debug/profile?seconds=abc").status_code == 404
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Replay captured orchestrator traffic and report capacity
+
+Traces come from the orchestrator with TRACE_CAPTURE_PATH set (optionally
+gzipped afterwards). Requests are sent open-loop: each one goes out at its
+scheduled time whether or not earlier ones finished, and latency is measured
+from that scheduled time so a saturated target shows up as queueing delay
+instead of being hidden.
+
+Examples:
+    # Replay at 3x the captured rate against a local orchestrator
+    python3 tools/loadgen.py replay trace.jsonl.gz --target http://localhost:8080 --speed 3 --out local.json
+
+    # Fixed Poisson arrival rate for two minutes
+    python3 tools/loadgen.py replay trace.jsonl.gz --target $URL --rate 25 --duration 120 --out prod.json
+
+    # Step through rates to find the throughput ceiling
+    python3 tools/loadgen.py sweep trace.jsonl.gz --target $URL --rates 5,10,20,40 --stage-seconds 30
+
+    # Compare two runs
+    python3 tools/loadgen.py compare local.json prod.json
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def load_trace(path):
+    """Return trace records sorted by arrival, with "t" offsets from the first"""
+    opener = gzip.open if path.endswith(".gz") else open
+    records = []
+    with opener(path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                if "ts" in record:
+                    records.append(record)
+    if not records:
+        sys.exit(f"No requests found in {path}")
+    records.sort(key=lambda r: r["ts"])
+    first = records[0]["ts"]
+    for record in records:
+        record["t"] = record["ts"] - first
+    return records
+
+def schedule_speed(records, speed, duration=None):
+    """Captured inter-arrival times divided by `speed`, looping the trace to fill `duration`"""
+    span = records[-1]["t"] / speed
+    # One trace's worth of gap between loops so the loop seam keeps the mean rate
+    period = span + (span / max(1, len(records) - 1)) or 1.0
+    for loop in itertools.count():
+        for record in records:
+            at = loop * period + record["t"] / speed
+            if duration is not None and at > duration:
+                return
+            yield at, record
+        if duration is None:
+            return
+
+def schedule_rate(records, rate, duration):
+    """Poisson arrivals at `rate` req/s, cycling through the trace bodies"""
+    at = 0.0
+    for record in itertools.cycle(records):
+        at += random.expovariate(rate)
+        if at > duration:
+            return
+        yield at, record
+
+def parse_server_timing(header):
+    """'intent;dur=12.3, compliance;dur=4' -> {'intent': 12.3, 'compliance': 4.0}"""
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
+
+def send(target, record, timeout):
+    body = json.dumps(record.get("b") or {}).encode()
+    headers = {"Content-Type": "application/json"}
+    headers.update(record.get("h") or {})
+    req = urllib.request.Request(target + record["p"], data=body, headers=headers,
+                                 method=record.get("m", "POST"))
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status, resp.headers.get("Server-Timing")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("Server-Timing")
+    except Exception:
+        return 0, None  # connection error or timeout
+
+def run(target, schedule, max_in_flight=256, timeout=30.0):
+    """Send every scheduled request open-loop and collect per-request results"""
+    results = []
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def fire(at, record):
+        sent = time.monotonic()
+        status, server_timing = send(target, record, timeout)
+        done = time.monotonic()
+        with lock:
+            results.append({
+                "path": record["p"],
+                "at": at,
+                "lag_ms": (sent - start - at) * 1000,
+                "latency_ms": (done - start - at) * 1000,
+                "done": done - start,
+                "status": status,
+                "timings": parse_server_timing(server_timing)
+            })
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for at, record in schedule:
+            delay = at - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, at, record)
+    return results, time.monotonic() - start
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 1)
+
+def distribution(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(values[-1], 1)
+    }
+
+def latency_growth(results):
+    """p50 latency of the last quarter of sends over the first quarter; a backlog makes it climb"""
+    ordered = sorted((r for r in results if 200 <= r["status"] < 400), key=lambda r: r["at"])
+    quarter = len(ordered) // 4
+    if quarter < 5:
+        return None
+    first = percentile(sorted(r["latency_ms"] for r in ordered[:quarter]), 50)
+    last = percentile(sorted(r["latency_ms"] for r in ordered[-quarter:]), 50)
+    return round(last / first, 2) if first else None
+
+def summarize(results, elapsed, offered_duration):
+    """Latency distributions, error rates and throughput per service
+
+    Throughput is successful requests over the offered window. The run also
+    waits for in-flight requests to drain after the last send. Counting that
+    drain time would make any slow but keeping-up target look saturated.
+    """
+    ok = [r for r in results if 200 <= r["status"] < 400]
+    completed_at = [int(r["done"]) for r in ok]
+    peak = max((completed_at.count(s) for s in set(completed_at)), default=0)
+
+    services = {"orchestrator": distribution([r["latency_ms"] for r in ok])}
+    for name in sorted({name for r in ok for name in r["timings"]}):
+        services[name] = distribution([r["timings"][name] for r in ok if name in r["timings"]])
+
+    by_path = {}
+    for path in sorted({r["path"] for r in results}):
+        subset = [r for r in results if r["path"] == path]
+        by_path[path] = {
+            "requests": len(subset),
+            "error_rate": round(sum(1 for r in subset if not 200 <= r["status"] < 400) / len(subset), 4)
+        }
+
+    total = len(results)
+    return {
+        "requests": total,
+        "offered_rps": round(total / offered_duration, 2) if offered_duration else None,
+        "throughput_rps": round(len(ok) / offered_duration, 2) if offered_duration else None,
+        "peak_rps_1s": peak,
+        "drain_s": round(max(0.0, elapsed - offered_duration), 2),
+        "latency_growth": latency_growth(results),
+        "error_rate": round((total - len(ok)) / total, 4) if total else 0.0,
+        "shed_rate": round(sum(1 for r in results if r["status"] == 429) / total, 4) if total else 0.0,
+        "send_lag_p99_ms": percentile(sorted(r["lag_ms"] for r in results), 99),
+        "latency_ms": services,
+        "paths": by_path
+    }
+
+def print_summary(label, summary):
+    print(f"\n== {label} ==")
+    print(f"requests {summary['requests']}  offered {summary['offered_rps']} rps  "
+          f"throughput {summary['throughput_rps']} rps  peak {summary['peak_rps_1s']} rps")
+    print(f"errors {summary['error_rate']:.2%}  shed (429) {summary['shed_rate']:.2%}  "
+          f"send lag p99 {summary['send_lag_p99_ms']} ms  drain {summary['drain_s']}s  "
+          f"latency growth {summary['latency_growth']}x")
+    print(f"{'service':<14}{'count':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, dist in summary["latency_ms"].items():
+        if dist["count"]:
+            print(f"{name:<14}{dist['count']:>7}" + "".join(
+                f"{dist[k]:>9}" for k in ("p50", "p90", "p95", "p99", "max")))
+
+def cmd_replay(args):
+    records = load_trace(args.trace)
+    if args.rate:
+        duration = args.duration or len(records) / args.rate
+        schedule = list(schedule_rate(records, args.rate, duration))
+    else:
+        schedule = list(schedule_speed(records, args.speed, args.duration))
+        duration = args.duration or (schedule[-1][0] if schedule else 0)
+    print(f"Replaying {len(schedule)} requests over {duration:.1f}s against {args.target}")
+    results, elapsed = run(args.target.rstrip("/"), schedule, args.max_in_flight, args.timeout)
+    summary = summarize(results, elapsed, duration)
+    summary["label"] = args.label or args.target
+    print_summary(summary["label"], summary)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved to {args.out}")
+
+def cmd_sweep(args):
+    records = load_trace(args.trace)
+    stages = []
+    ceiling = None
+    for rate in [float(r) for r in args.rates.split(",")]:
+        schedule = list(schedule_rate(records, rate, args.stage_seconds))
+        results, elapsed = run(args.target.rstrip("/"), schedule, args.max_in_flight, args.timeout)
+        summary = summarize(results, elapsed, args.stage_seconds)
+        summary["label"] = f"{rate:g} rps"
+        print_summary(summary["label"], summary)
+        stages.append(summary)
+        # Sustained = every request completed within the error budget, and latency did not keep
+        # climbing through the stage (a growing queue); wall time spent draining does not count
+        growth = summary["latency_growth"]
+        p99 = summary["latency_ms"]["orchestrator"].get("p99")
+        kept_up = (
+            summary["error_rate"] <= args.max_error_rate
+            and (growth is None or growth <= args.max_latency_growth)
+            and (args.max_p99_ms is None or (p99 is not None and p99 <= args.max_p99_ms))
+        )
+        if kept_up:
+            ceiling = rate
+        else:
+            break
+    print(f"\nThroughput ceiling: {ceiling if ceiling is not None else 'below lowest stage'} rps")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"label": args.label or args.target, "ceiling_rps": ceiling, "stages": stages}, f, indent=2)
+        print(f"Saved to {args.out}")
+
+def cmd_compare(args):
+    with open(args.a) as f:
+        a = json.load(f)
+    with open(args.b) as f:
+        b = json.load(f)
+    label_a, label_b = a.get("label", args.a), b.get("label", args.b)
+    print(f"{'metric':<28}{label_a[:18]:>20}{label_b[:18]:>20}{'delta':>20}")
+
+    def row(name, va, vb, pct=False):
+        delta = ""
+        if isinstance(va, (int, float)) and isinstance(vb, (int, float)):
+            delta = f"{(vb - va) * 100:+.2f}pp" if pct else f"{vb - va:+.1f}"
+            if not pct and va:
+                delta += f" ({(vb - va) / va:+.0%})"
+        fmt = (lambda v: f"{v:.2%}" if isinstance(v, (int, float)) else "-") if pct else \
+              (lambda v: "-" if v is None else str(v))
+        print(f"{name:<28}{fmt(va):>20}{fmt(vb):>20}{delta:>20}")
+
+    for key in ("requests", "offered_rps", "throughput_rps", "peak_rps_1s", "latency_growth"):
+        row(key, a.get(key), b.get(key))
+    for key in ("error_rate", "shed_rate"):
+        row(key, a.get(key), b.get(key), pct=True)
+    for service in sorted(set(a.get("latency_ms", {})) | set(b.get("latency_ms", {}))):
+        dist_a = a.get("latency_ms", {}).get(service, {})
+        dist_b = b.get("latency_ms", {}).get(service, {})
+        for stat in ("p50", "p95", "p99"):
+            row(f"{service} {stat} (ms)", dist_a.get(stat), dist_b.get(stat))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured orchestrator traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_target_args(p):
+        p.add_argument("trace", help="Trace file from TRACE_CAPTURE_PATH (.jsonl or .jsonl.gz)")
+        p.add_argument("--target", required=True, help="Base URL, e.g. http://localhost:8080")
+        p.add_argument("--max-in-flight", type=int, default=256)
+        p.add_argument("--timeout", type=float, default=30.0)
+        p.add_argument("--label", help="Name for this run in reports")
+        p.add_argument("--out", help="Write the summary JSON here")
+
+    replay = sub.add_parser("replay", help="Replay a trace once or for a fixed duration")
+    add_target_args(replay)
+    mode = replay.add_mutually_exclusive_group()
+    mode.add_argument("--speed", type=float, default=1.0, help="Multiply the captured arrival rate")
+    mode.add_argument("--rate", type=float, help="Open-loop Poisson arrival rate (req/s)")
+    replay.add_argument("--duration", type=float, help="Seconds to run (loops the trace)")
+    replay.set_defaults(func=cmd_replay)
+
+    sweep = sub.add_parser("sweep", help="Increase the arrival rate until the target stops keeping up")
+    add_target_args(sweep)
+    sweep.add_argument("--rates", required=True, help="Comma-separated req/s stages, e.g. 5,10,20")
+    sweep.add_argument("--stage-seconds", type=float, default=30.0)
+    sweep.add_argument("--max-error-rate", type=float, default=0.01)
+    sweep.add_argument("--max-latency-growth", type=float, default=2.0,
+                       help="Fail a stage if late requests' p50 exceeds early requests' p50 by this factor")
+    sweep.add_argument("--max-p99-ms", type=float, help="Optional p99 latency objective per stage")
+    sweep.set_defaults(func=cmd_sweep)
+
+    compare = sub.add_parser("compare", help="Compare two saved run summaries side by side")
+    compare.add_argument("a")
+    compare.add_argument("b")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()